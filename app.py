@@ -1,4 +1,5 @@
 import streamlit as st
+from utils import profiling, warmup
 # Set page config must be the first Streamlit command
 st.set_page_config(
     page_title="Developers Survey Data Story",
@@ -124,5 +125,8 @@ def main():
         if st.button("Start Exploring", key="start_button", type="primary", use_container_width=True):
             st.switch_page("pages/1_home.py")
 
+    # 歡迎頁面畫好之後才在背景載入 plotly / pandas 和資料集
+    warmup.start()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_page(main)
\ No newline at end of file
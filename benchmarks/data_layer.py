@@ -0,0 +1,250 @@
+"""Benchmarks for the data layer and every page computation.
+
+Times parsing the zip (single- and multi-threaded), cold and warm
+``GetData`` loads, ``Client`` construction, each ``Calculate`` method and
+a few ``Client.count`` queries, and records the peak memory of every
+step: Python allocations (tracemalloc) and Arrow's memory pool, which
+tracemalloc cannot see (pyarrow CSV parsing, ``to_pandas`` conversions). Runs on the real survey zip and on
+synthetic datasets (see ``benchmarks/synthetic.py``) scaled to a multiple
+of its respondent count.
+
+    python -m benchmarks.data_layer --scales 1 10 100 --output bench.json
+    python -m benchmarks.data_layer --compare bench.json new.json
+
+Results are JSON so successive runs can be diffed with ``--compare``.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import pyarrow as pa
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import SurveyModel, write_csv_zip  # noqa: E402
+from utils.cache import result_cache  # noqa: E402
+from utils.calculate import Calculate  # noqa: E402
+from utils.client import Client  # noqa: E402
+from utils.get_data import GetData  # noqa: E402
+from utils.snapshot import SOURCE_ZIP, read_source  # noqa: E402
+
+CLIENT_GETTERS = [
+    'get_AI_usage',
+    'get_age_usage',
+    'get_age_employment_distribution',
+    'get_ai_usage_percentage',
+    'get_edu_brain_for_heatmap',
+    'get_favorable_on_edu_and_code',
+    'get_benefit_wordcloud',
+    'get_AI_tool_currently_using',
+]
+
+# (Calculate 方法, 需要的 Client 資料框)
+CALCULATE_METHODS = [
+    ('calculate_percentage_of_AI_usage', ('AI',)),
+    ('calculate_percentage_of_age', ('BI',)),
+    ('calculate_age_employment_distribution', ('BI',)),
+    ('calculate_ai_usage_percentage', ('AI', 'BI')),
+    ('calculate_edu_brain_for_heatmap', ('EWC', 'BI')),
+    ('calculate_favorable_on_edu_and_code', ('EWC', 'BI', 'AI')),
+    ('benefit_wordcloud', ('AI',)),
+    ('calculate_AI_tool_currently_using', ('AI',)),
+]
+
+COUNT_QUERIES = {
+    'count.sentiment_by_background': dict(
+        by=['AISent'],
+        where={'MainBranch': 'I am a developer by profession',
+               'EdLevel': 'Bachelor’s degree (B.A., B.S., B.Eng., etc.)'},
+    ),
+    'count.tools_by_sentiment': dict(by=['AIToolCurrently Using'], where={'AISent': 'Favorable'}),
+    'count.sentiment_by_employment': dict(by=['AISent'], where={'Employment': 'Student, full-time'}),
+    'count.age_by_benefit': dict(by=['Age'], where={'AIBen': ['Speed up learning']}),
+}
+
+
+def _quiet(func, *args, **kwargs):
+    # 建立快照時的訊息不要混進 benchmark 輸出
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def measure(func, repeats=3, setup=None):
+    """Time ``func`` ``repeats`` times, then measure its peak memory once.
+
+    ``python_peak_bytes`` is the tracemalloc peak, ``arrow_peak_bytes`` the
+    peak of a proxy Arrow memory pool installed for the run (Arrow buffers
+    bypass tracemalloc); ``peak_bytes`` is their sum, an upper bound.
+    """
+    seconds = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        _quiet(func)
+        seconds.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    # 每次量測用新的 proxy pool，max_memory() 只反映這次執行的 Arrow 配置
+    default_pool = pa.default_memory_pool()
+    arrow_pool = pa.proxy_memory_pool(default_pool)
+    pa.set_memory_pool(arrow_pool)
+    tracemalloc.start()
+    try:
+        _quiet(func)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(default_pool)
+    return {
+        'min_s': min(seconds),
+        'median_s': statistics.median(seconds),
+        'repeats': repeats,
+        'python_peak_bytes': peak,
+        'arrow_peak_bytes': arrow_pool.max_memory(),
+        'peak_bytes': peak + arrow_pool.max_memory(),
+    }
+
+
+def _remove_derived_files():
+    for name in os.listdir('.'):
+        if name.endswith(('.arrow', '.cube.npz')):
+            os.remove(name)
+
+
+def bench_dataset(label, zip_path, repeats):
+    """Run every benchmark on one dataset; returns a list of result rows."""
+    rows = []
+    workdir = tempfile.mkdtemp(prefix=f'bench-{label}-')
+    cwd = os.getcwd()
+    try:
+        os.symlink(os.path.abspath(zip_path), os.path.join(workdir, SOURCE_ZIP))
+        # GetData 以相對路徑讀取資料
+        os.chdir(workdir)
+
+        def record(step, stats):
+            rows.append({'dataset': label, 'step': step, **stats})
+            print(f"{label:>6} {step:<50} {stats['median_s'] * 1000:10.2f} ms "
+                  f"{stats['python_peak_bytes'] / 2**20:9.1f} MiB py "
+                  f"{stats['arrow_peak_bytes'] / 2**20:9.1f} MiB arrow", file=sys.stderr)
+
+        # 解析 zip 中的所有欄位，比較單執行緒和多執行緒的讀法
+        for engine in ('pandas', 'pyarrow'):
+            record(f'read_source.{engine}', measure(
+                lambda: read_source(SOURCE_ZIP, columns=None, engine=engine), repeats=repeats
+            ))
+        # cold = 從 zip 建立快照與 cube；warm = 直接讀取快照
+        record('GetData.cold', measure(GetData, repeats=1, setup=_remove_derived_files))
+        record('GetData.warm', measure(GetData, repeats=repeats))
+        record('Client.construct', measure(Client, repeats=repeats))
+
+        client = _quiet(Client)
+        for getter in CLIENT_GETTERS:
+            record(f'Client.{getter}.uncached', measure(getattr(client, getter), repeats=repeats, setup=result_cache.clear))
+            record(f'Client.{getter}.cached', measure(getattr(client, getter), repeats=repeats))
+
+        # 不經 cube 和快取，直接掃描欄位的計算成本
+        scan = Calculate(options=client.calculate.options)
+        for method, frames in CALCULATE_METHODS:
+            args = [getattr(client, name) for name in frames]
+            record(f'Calculate.{method}.scan', measure(lambda: getattr(scan, method)(*args), repeats=repeats))
+
+        for name, query in COUNT_QUERIES.items():
+            plan = client.query.plan(**query)
+            record(f'{name}.{plan}', measure(lambda: client.count(**query), repeats=repeats, setup=result_cache.clear))
+        for row in rows:
+            row['respondents'] = len(client.AI)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(source_zip, scales, repeats, include_real=True, seed=0):
+    results = []
+    if include_real:
+        results += bench_dataset('real', source_zip, repeats)
+    tmpdir = tempfile.mkdtemp(prefix='bench-synthetic-')
+    try:
+        source = _quiet(SurveyModel.from_zip, source_zip)
+        respondents = int(source.tables[source.order[0]].sum())
+        for factor in scales:
+            target = write_csv_zip(source, factor * respondents, os.path.join(tmpdir, f'{factor}x.csv.zip'), seed)
+            results += bench_dataset(f'{factor}x', target, repeats)
+            os.remove(target)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pandas': pd.__version__,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'source': os.path.abspath(source_zip),
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(old_path, new_path):
+    """Print the median-time ratio (new / old) of every step found in both runs."""
+    with open(old_path) as f:
+        old = {(r['dataset'], r['step']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {(r['dataset'], r['step']): r for r in json.load(f)['results']}
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key]['median_s'], new[key]['median_s']
+        ratio = after / before if before else float('inf')
+        print(f"{key[0]:>6} {key[1]:<50} {before * 1000:10.2f} -> {after * 1000:10.2f} ms  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=SOURCE_ZIP, help='survey zip to benchmark and scale')
+    parser.add_argument('--scales', type=int, nargs='*', default=[1, 10, 100],
+                        help='synthetic dataset sizes as multiples of the source respondents')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic datasets')
+    parser.add_argument('--skip-real', action='store_true', help='only run the synthetic datasets')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args.source, args.scales, args.repeats, include_real=not args.skip_real, seed=args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""Headless multi-session load test of the page funnel.
+
+Drives simulated users through app.py -> 1_home -> ... -> 8_summary with
+Streamlit's AppTest, in-process and concurrently, making random selectbox
+and button choices on the way. Reports rerun latency percentiles per page
+and action, throughput and the memory growth of each process.
+
+    python -m benchmarks.load_test --sessions 100 --concurrency 8 --output load.json
+    python -m benchmarks.load_test --sessions 400 --concurrency 8 --processes 4
+
+AppTest swaps out process-global Streamlit state while a script runs, so
+within one process the sessions take turns (a real server's reruns share
+one GIL too); the reported latency includes the time spent waiting for
+other sessions. ``--processes`` adds CPU parallelism like extra replicas.
+
+AppTest does not follow ``st.switch_page`` (the click run renders the next
+page, but the following reruns would go back to the first one), so each
+simulated user opens every page in a fresh AppTest that carries over the
+session state of the previous page, like a browser tab would. That first
+run is recorded as the page's ``load``, widget changes as ``interact`` and
+the click on the forward button as ``navigate``.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit import logger as st_logger  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _button(at, text):
+    """The first button whose key or label contains ``text``."""
+    for button in at.button:
+        if button.key == text or text in button.label:
+            return button
+    raise LookupError(f"No button matching {text!r}")
+
+
+def _pick(at, rng, key=None, index=0):
+    box = at.selectbox(key=key) if key else at.selectbox[index]
+    box.select(rng.choice(box.options))
+
+
+def _interact_profile(at, rng):
+    _pick(at, rng, key='Age')
+    _pick(at, rng, key='Employment')
+
+
+def _interact_age_detail(at, rng):
+    # 一半的使用者會展開年齡細節再收起
+    if rng.random() < 0.5:
+        _button(at, 'my age group').click()
+        yield
+        _button(at, 'Back to Overview').click()
+
+
+def _interact_relationship(at, rng):
+    _pick(at, rng, index=0)
+    _pick(at, rng, index=1)
+
+
+def _interact_sentiment(at, rng):
+    _pick(at, rng, index=0)
+
+
+def _single(interaction):
+    def run(at, rng):
+        interaction(at, rng)
+        yield
+    return run
+
+
+# (頁面, 頁面上的互動, 前往下一頁的按鈕)
+FUNNEL = [
+    ('app.py', None, 'start_button'),
+    ('pages/1_home.py', None, 'find_out'),
+    ('pages/2_knowmoreaboutyou.py', _single(_interact_profile), 'next_page'),
+    ('pages/3_doyouknow.py', _interact_age_detail, 'Next Page'),
+    ('pages/4_relationshiptocode.py', None, 'Next Page'),
+    ('pages/5_selectrelationship.py', _single(_interact_relationship), 'next_page'),
+    ('pages/6_favorable.py', _single(_interact_sentiment), 'next_page'),
+    ('pages/7_knowmoreaboutidea.py', None, 'HEADING'),
+    ('pages/8_summary.py', None, 'Start Over'),
+]
+
+
+def _rss_bytes():
+    """Current resident set size, or the peak when /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 回報 bytes，Linux 回報 KiB
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# AppTest 會暫時替換 Streamlit 的全域狀態，同一個 process 內一次只能跑一個腳本
+_script_lock = threading.Lock()
+
+
+class Recorder:
+    """Thread-safe collection of rerun latencies and errors.
+
+    ``latencies`` are response times as a user sees them: the time queued
+    behind other sessions' reruns plus the rerun itself (``service``).
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.service = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def timed_run(self, at, page, action):
+        queued = time.perf_counter()
+        with _script_lock:
+            start = time.perf_counter()
+            try:
+                at.run()
+                errors = [e.value for e in at.exception]
+            except Exception as e:
+                errors = [repr(e)]
+            finished = time.perf_counter()
+        key = f'{page}:{action}'
+        with self._lock:
+            self.latencies.setdefault(key, []).append(finished - queued)
+            self.service.setdefault(key, []).append(finished - start)
+            if errors:
+                self.errors.setdefault(key, []).extend(errors)
+        return not errors
+
+
+# 在腳本執行之外寫入 session_state 時 Streamlit 會警告缺少 ScriptRunContext；
+# AppTest 會重設 log level，所以用 filter 擋掉
+st_logger.get_logger('streamlit.runtime.scriptrunner_utils.script_run_context').addFilter(
+    lambda record: 'missing ScriptRunContext' not in record.getMessage()
+)
+
+
+def _open(page, state, timeout):
+    at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=timeout)
+    at.switch_page(page)
+    for key, value in state.items():
+        at.session_state[key] = value
+    return at
+
+
+def run_session(session, seed, recorder, timeout):
+    """Walk one simulated user through the whole funnel."""
+    rng = random.Random(seed * 1_000_003 + session)
+    state = {}
+    for page, interaction, forward in FUNNEL:
+        name = os.path.splitext(os.path.basename(page))[0]
+        at = _open(page, state, timeout)
+        if not recorder.timed_run(at, name, 'load'):
+            return False
+        if interaction:
+            for _ in interaction(at, rng):
+                if not recorder.timed_run(at, name, 'interact'):
+                    return False
+        _button(at, forward).click()
+        if not recorder.timed_run(at, name, 'navigate'):
+            return False
+        state = at.session_state.filtered_state
+    return True
+
+
+def _summary(values):
+    ordered = sorted(values)
+    result = {'n': len(ordered), 'mean_ms': statistics.fmean(ordered) * 1000}
+    for p in PERCENTILES:
+        index = min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))
+        result[f'p{p}_ms'] = ordered[index] * 1000
+    result['max_ms'] = ordered[-1] * 1000
+    return result
+
+
+def run_partition(session_ids, concurrency, seed=0, timeout=120, warmup=1, data_dir=ROOT):
+    """Run ``session_ids`` in this process, ``concurrency`` of them at a time."""
+    # 頁面以相對路徑讀取資料；建立快照時的訊息不要混進 JSON
+    os.chdir(data_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        # 先跑幾個 session 讓資料和快取載入，不計入結果
+        for session in range(warmup):
+            run_session(-1 - session, seed, Recorder(), timeout)
+
+        recorder = Recorder()
+        memory = [_rss_bytes()]
+        completed = []
+        start = time.perf_counter()
+
+        def worker(session):
+            completed.append(run_session(session, seed, recorder, timeout))
+            memory.append(_rss_bytes())
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, session_ids))
+        wall = time.perf_counter() - start
+    return {
+        'latencies': recorder.latencies,
+        'service': recorder.service,
+        'errors': recorder.errors,
+        'completed': completed,
+        'wall_s': wall,
+        'memory': {
+            'rss_start_bytes': memory[0],
+            'rss_end_bytes': memory[-1],
+            'rss_max_bytes': max(memory),
+            'growth_per_session_bytes': (memory[-1] - memory[0]) / max(len(session_ids), 1),
+        },
+    }
+
+
+def run(sessions, concurrency, processes=1, seed=0, timeout=120, warmup=1, data_dir=ROOT):
+    """Run ``sessions`` simulated users and summarise latency, throughput and memory.
+
+    Each of the ``processes`` workers keeps ``concurrency`` sessions in
+    flight; processes add CPU parallelism the way extra replicas would.
+    """
+    args = (concurrency, seed, timeout, warmup, data_dir)
+    if processes == 1:
+        parts = [run_partition(range(sessions), *args)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(run_partition, range(i, sessions, processes), *args) for i in range(processes)]
+            parts = [future.result() for future in futures]
+
+    latencies, service, errors = {}, {}, {}
+    for part in parts:
+        for merged, values in ((latencies, part['latencies']), (service, part['service']), (errors, part['errors'])):
+            for key, items in values.items():
+                merged.setdefault(key, []).extend(items)
+    completed = [ok for part in parts for ok in part['completed']]
+    # 各 process 同時執行，總時間取最慢的一個
+    wall = max(part['wall_s'] for part in parts)
+    reruns = sum(len(values) for values in latencies.values())
+
+    pages = {}
+    for key, values in sorted(latencies.items()):
+        page, action = key.split(':')
+        pages.setdefault(page, {})[action] = {
+            **_summary(values),
+            'service_mean_ms': statistics.fmean(service[key]) * 1000,
+        }
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sessions': sessions,
+            'concurrency': concurrency,
+            'processes': processes,
+            'seed': seed,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'throughput': {
+            'wall_s': wall,
+            'sessions_completed': sum(completed),
+            'sessions_failed': len(completed) - sum(completed),
+            'sessions_per_s': len(completed) / wall,
+            'reruns_per_s': reruns / wall,
+        },
+        'memory': [part['memory'] for part in parts],
+        'all_reruns': _summary([v for values in latencies.values() for v in values]),
+        'pages': pages,
+        'errors': {key: values[:5] for key, values in errors.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=20, help='simulated users to run')
+    parser.add_argument('--concurrency', type=int, default=4, help='users in flight per process')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes (replicas) sharing the sessions')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120, help='seconds allowed per rerun')
+    parser.add_argument('--warmup', type=int, default=1, help='unrecorded sessions run first in each process')
+    parser.add_argument('--data-dir', default=ROOT, help='directory holding the survey zip / snapshot')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = run(args.sessions, args.concurrency, args.processes, args.seed,
+                 args.timeout, args.warmup, os.path.abspath(args.data_dir))
+    for page, actions in report['pages'].items():
+        for action, stats in actions.items():
+            print(f"{page:<24} {action:<9} n={stats['n']:<5} p50={stats['p50_ms']:8.1f} ms "
+                  f"p95={stats['p95_ms']:8.1f} ms p99={stats['p99_ms']:8.1f} ms", file=sys.stderr)
+    throughput = report['throughput']
+    print(f"{throughput['sessions_per_s']:.2f} sessions/s, {throughput['reruns_per_s']:.1f} reruns/s, "
+          f"{throughput['sessions_failed']} failed", file=sys.stderr)
+    for i, memory in enumerate(report['memory']):
+        print(f"process {i}: RSS {memory['rss_start_bytes'] / 2**20:.0f} -> "
+              f"{memory['rss_end_bytes'] / 2**20:.0f} MiB", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
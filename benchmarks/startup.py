@@ -0,0 +1,150 @@
+"""Cold-start time to first paint.
+
+Every scenario runs in a fresh Python process, like a newly started
+replica, with an empty render cache:
+
+``welcome``
+    The welcome page (``app.py``) with the warm-up turned off: how long its
+    first run takes and which heavy modules it had to load to be drawn
+    (beyond those Streamlit itself imports).
+``home_cold``
+    The welcome page, then immediately ``pages/1_home.py`` without warm-up:
+    the first data page pays for Plotly, pandas and the dataset itself.
+``home_after_warmup``
+    The welcome page, the background warm-up given time to finish (a user
+    reading the welcome page), then ``pages/1_home.py``.
+
+    python -m benchmarks.startup --repeats 5 --output startup.json
+
+``spawn_to_paint_s`` also counts starting Python and importing Streamlit,
+which a real server pays once at boot rather than per session.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ('welcome', 'home_cold', 'home_after_warmup')
+
+# 第一次繪製前不應該載入的模組
+HEAVY_MODULES = ('pandas', 'pyarrow', 'plotly.graph_objects', 'plotly.express', 'matplotlib', 'wordcloud')
+
+
+def _child(scenario, data_dir, warmup_timeout):
+    """Run one scenario in this (fresh) process and return its timings."""
+    spawned = float(os.environ['SURVEY_STARTUP_SPAWNED'])
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    os.chdir(data_dir)
+    from streamlit.testing.v1 import AppTest
+
+    result = {'import_streamlit_s': time.perf_counter() - start}
+    welcome = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=120)
+    loaded = set(sys.modules)
+    start = time.perf_counter()
+    welcome.run()
+    result['welcome_s'] = time.perf_counter() - start
+    result['spawn_to_paint_s'] = time.time() - spawned
+    result['heavy_modules_at_paint'] = [
+        name for name in HEAVY_MODULES if name in sys.modules and name not in loaded
+    ]
+    if scenario == 'welcome':
+        return result
+
+    if scenario == 'home_after_warmup':
+        from utils import warmup
+
+        start = time.perf_counter()
+        warmup.wait(warmup_timeout)
+        result['warmup_wait_s'] = time.perf_counter() - start
+        result['warmup'] = dict(warmup.timings)
+    home = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=120)
+    home.switch_page('pages/1_home.py')
+    start = time.perf_counter()
+    home.run()
+    result['home_s'] = time.perf_counter() - start
+    result['errors'] = [e.value for e in welcome.exception] + [e.value for e in home.exception]
+    return result
+
+
+def run_scenario(scenario, data_dir, repeats, warmup_timeout=120):
+    runs = []
+    for _ in range(repeats):
+        cache_dir = tempfile.mkdtemp(prefix='render-cache-')
+        env = dict(
+            os.environ,
+            SURVEY_STARTUP_SPAWNED=repr(time.time()),
+            SURVEY_RENDER_CACHE_DIR=cache_dir,
+            SURVEY_WARMUP='1' if scenario == 'home_after_warmup' else '0',
+        )
+        try:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.startup', '--child', scenario,
+                 '--data-dir', data_dir, '--warmup-timeout', str(warmup_timeout)],
+                cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        # 只取最後一行，前面可能有建立快照時的訊息
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    summary = {'runs': runs}
+    for key in ('welcome_s', 'spawn_to_paint_s', 'home_s', 'warmup_wait_s'):
+        values = [r[key] for r in runs if key in r]
+        if values:
+            summary[key] = {'min': min(values), 'median': statistics.median(values)}
+    return summary
+
+
+def run(data_dir, repeats, scenarios=SCENARIOS, warmup_timeout=120):
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeats': repeats,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'scenarios': {name: run_scenario(name, data_dir, repeats, warmup_timeout) for name in scenarios},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=3, help='fresh processes per scenario')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--data-dir', default=ROOT, help='directory holding the survey zip / snapshot')
+    parser.add_argument('--warmup-timeout', type=float, default=120)
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    data_dir = os.path.abspath(args.data_dir)
+
+    if args.child:
+        print(json.dumps(_child(args.child, data_dir, args.warmup_timeout)))
+        return
+
+    report = run(data_dir, args.repeats, args.scenarios, args.warmup_timeout)
+    for name, summary in report['scenarios'].items():
+        parts = [f"{key}={summary[key]['median'] * 1000:.0f} ms"
+                 for key in ('welcome_s', 'spawn_to_paint_s', 'warmup_wait_s', 'home_s') if key in summary]
+        heavy = summary['runs'][0]['heavy_modules_at_paint']
+        print(f"{name:<18} {' '.join(parts)} heavy at paint: {', '.join(heavy) or '-'}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
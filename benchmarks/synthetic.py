@@ -0,0 +1,289 @@
+"""Synthetic survey data at any scale.
+
+``SurveyModel`` learns the distribution of the survey columns the pages
+use from a real survey zip and samples new respondents from it. The joint
+distribution is approximated by a Chow-Liu forest: every column is drawn
+conditionally on the one other column it shares the most information with
+(or from its marginal when no dependency is significant), so the strongest
+pairwise relationships (e.g. AISelect/AISent, AISent/AIBen) are kept while
+any number of distinct respondents can be produced.
+Multi-select columns are modelled as their ';'-joined answer combinations,
+which keeps the correlation between the options of one question.
+
+Output is streamed in batches, so memory is bounded by ``batch_size``
+whatever the number of rows. Respondents are drawn in fixed chunks of
+``CHUNK_ROWS``, each from its own generator seeded with ``(seed, chunk)``,
+so the same seed gives the same respondents at any ``batch_size``.
+
+    python -m benchmarks.synthetic --rows 5000000 --output big.csv.zip
+    python -m benchmarks.synthetic --rows 5000000 --output survey_results_public.arrow
+
+A ``.csv.zip`` output has the layout of the original download; an
+``.arrow`` output is an encoded snapshot that ``GetData`` serves directly
+(place it in the project root without a zip).
+"""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import schema  # noqa: E402
+from utils.snapshot import SOURCE_ZIP, read_source, snapshot_stamp, write_snapshot  # noqa: E402
+
+# 模型化的欄位（頁面用到的群組）；ResponseId 依序產生
+COLUMNS = schema.group_columns(*schema.CORE_GROUPS)
+MODELLED = [column for column in COLUMNS if column != schema.KEY_COLUMN]
+
+DEFAULT_BATCH_SIZE = 100_000
+# 抽樣的固定區塊大小；每個區塊有自己的亂數產生器，結果和 batch_size 無關
+CHUNK_ROWS = 65_536
+
+
+def _edge_score(a, b, n_a, n_b):
+    """Mutual information of two code arrays minus its BIC penalty.
+
+    Without the penalty the many-valued multi-select combinations look
+    informative about every column (their sparse joint tables overfit) and
+    would become the parent of everything.
+    """
+    joint = np.bincount(a * n_b + b, minlength=n_a * n_b).reshape(n_a, n_b) / len(a)
+    outer = joint.sum(axis=1, keepdims=True) @ joint.sum(axis=0, keepdims=True)
+    nonzero = joint > 0
+    information = float((joint[nonzero] * np.log(joint[nonzero] / outer[nonzero])).sum())
+    return information - (n_a - 1) * (n_b - 1) * np.log(len(a)) / (2 * len(a))
+
+
+class SurveyModel:
+    """Chow-Liu forest over the answers of the modelled columns."""
+
+    def __init__(self, values, order, parents, tables):
+        # 欄位 -> 出現過的答案，None 代表未作答
+        self.values = values
+        # 抽樣順序，父欄位一定排在子欄位前面
+        self.order = order
+        # 欄位 -> 父欄位（樹根為 None）
+        self.parents = parents
+        # 欄位 -> 計數；樹根是一維，其餘是 (父欄位答案數, 答案數)
+        self.tables = tables
+
+    @classmethod
+    def fit(cls, df, columns=MODELLED):
+        """Learn the marginal and pairwise answer counts of ``df``."""
+        values = {}
+        codes = {}
+        for column in columns:
+            column_codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+            values[column] = [None if pd.isna(v) else str(v) for v in uniques]
+            codes[column] = column_codes.astype(np.int64)
+
+        # Prim 演算法求分數最大的生成樹；沒有正分數的邊時，剩下的欄位另起一棵樹
+        order = []
+        parents = {}
+        remaining = list(columns)
+        scores = {}
+        while remaining:
+            best = None
+            for child in remaining:
+                for parent in order:
+                    key = (parent, child)
+                    if key not in scores:
+                        scores[key] = _edge_score(
+                            codes[parent], codes[child], len(values[parent]), len(values[child])
+                        )
+                    if scores[key] > 0 and (best is None or scores[key] > scores[best]):
+                        best = key
+            parent, child = best or (None, remaining[0])
+            order.append(child)
+            parents[child] = parent
+            remaining.remove(child)
+
+        tables = {}
+        for column in order:
+            parent = parents[column]
+            n = len(values[column])
+            if parent is None:
+                tables[column] = np.bincount(codes[column], minlength=n)
+            else:
+                n_parent = len(values[parent])
+                tables[column] = np.bincount(
+                    codes[parent] * n + codes[column], minlength=n_parent * n
+                ).reshape(n_parent, n)
+        return cls(values, order, parents, tables)
+
+    @classmethod
+    def from_zip(cls, zip_path=SOURCE_ZIP, aliases=None):
+        return cls.fit(read_source(zip_path, aliases, columns=COLUMNS))
+
+    @property
+    def fingerprint(self):
+        """Hash of the learned distribution, used to version generated data."""
+        digest = hashlib.sha256()
+        for column in self.order:
+            digest.update(repr((column, self.parents[column], self.values[column])).encode())
+            digest.update(np.ascontiguousarray(self.tables[column]).tobytes())
+        return digest.hexdigest()
+
+    def sample_codes(self, n, rng):
+        """Draw ``n`` respondents as {column: indices into ``values[column]``}."""
+        codes = {}
+        for column in self.order:
+            parent = self.parents[column]
+            table = self.tables[column]
+            if parent is None:
+                codes[column] = rng.choice(len(table), size=n, p=table / table.sum())
+                continue
+            cdf = np.cumsum(table, axis=1)
+            u = rng.random(n)
+            drawn = np.empty(n, dtype=np.int64)
+            # 依父欄位的答案分組，每組一次 searchsorted
+            parent_codes = codes[parent]
+            for p in np.unique(parent_codes):
+                rows = parent_codes == p
+                drawn[rows] = np.searchsorted(cdf[p], u[rows] * cdf[p, -1], side='right')
+            codes[column] = np.minimum(drawn, table.shape[1] - 1)
+        return codes
+
+    def chunks(self, n_rows, seed=0):
+        """Yield the codes of ``n_rows`` respondents in chunks of ``CHUNK_ROWS``, chunk ``i`` seeded with ``(seed, i)``."""
+        for i, start in enumerate(range(0, n_rows, CHUNK_ROWS)):
+            yield self.sample_codes(min(CHUNK_ROWS, n_rows - start), np.random.default_rng([seed, i]))
+
+    def batches(self, n_rows, seed=0, batch_size=DEFAULT_BATCH_SIZE):
+        """Yield (first ResponseId, codes) for ``n_rows`` respondents in batches of ``batch_size``."""
+        # 上一個區塊切剩的列，和下一個區塊接起來再切
+        pending = None
+        first_id = 1
+        for chunk in self.chunks(n_rows, seed):
+            if pending is not None:
+                chunk = {column: np.concatenate([pending[column], chunk[column]]) for column in self.order}
+            n = len(chunk[self.order[0]])
+            last = first_id + n > n_rows
+            start = 0
+            while n - start >= batch_size or (last and start < n):
+                size = min(batch_size, n - start)
+                yield first_id, {column: values[start:start + size] for column, values in chunk.items()}
+                first_id += size
+                start += size
+            pending = {column: values[start:] for column, values in chunk.items()} if start < n else None
+
+    def frames(self, n_rows, seed=0, batch_size=DEFAULT_BATCH_SIZE):
+        """Yield the respondents as raw-answer DataFrames in the source layout."""
+        answers = {column: np.asarray(self.values[column], dtype=object) for column in self.order}
+        for first_id, codes in self.batches(n_rows, seed, batch_size):
+            n = len(codes[self.order[0]])
+            frame = {'ResponseId': np.arange(first_id, first_id + n, dtype=np.int64)}
+            for column in MODELLED:
+                if column in answers:
+                    frame[column] = answers[column][codes[column]]
+            yield pd.DataFrame(frame)
+
+
+def write_csv_zip(model, n_rows, path, seed=0, batch_size=DEFAULT_BATCH_SIZE):
+    """Write ``n_rows`` synthetic respondents as a zipped CSV like the survey download."""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as target:
+        with target.open('survey_results_public.csv', 'w', force_zip64=True) as raw:
+            out = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            header = True
+            for frame in model.frames(n_rows, seed, batch_size):
+                frame.to_csv(out, index=False, header=header)
+                header = False
+            out.flush()
+            out.detach()
+    return path
+
+
+def _index_type(size):
+    for index_type, dtype in ((pa.int8(), np.int8), (pa.int16(), np.int16), (pa.int32(), np.int32)):
+        if size <= np.iinfo(dtype).max:
+            return index_type, dtype
+    raise ValueError(f"Too many categories: {size}")
+
+
+def write_arrow_snapshot(model, n_rows, path, seed=0, batch_size=DEFAULT_BATCH_SIZE):
+    """Write ``n_rows`` synthetic respondents directly as an encoded snapshot.
+
+    The encoding is the one ``build_snapshot`` produces (categoricals in the
+    documented order, multi-select bitmasks), so the file can be served
+    without going through a CSV.
+    """
+    # 每個欄位：模型答案代碼 -> 快照中的值（類別代碼或 bitmask）
+    encoders = {}
+    fields = [pa.field('ResponseId', pa.int64())]
+    options = {}
+    for column in MODELLED:
+        if column not in model.values:
+            continue
+        answers = model.values[column]
+        observed = [a for a in answers if a is not None]
+        if column in schema.MULTI_SELECT:
+            column_options, indicator = schema.split_multi_select(observed, schema.MULTI_SELECT[column])
+            dtype = schema.mask_dtype(len(column_options))
+            weights = np.left_shift(np.uint64(1), np.arange(len(column_options), dtype=np.uint64))
+            masks = iter((indicator.astype(np.uint64) @ weights).astype(dtype))
+            encoders[column] = ('mask', np.array([0 if a is None else next(masks) for a in answers], dtype=dtype))
+            options[column] = column_options
+            fields.append(pa.field(column, pa.from_numpy_dtype(dtype)))
+        else:
+            categories = schema.ordered_categories(observed, schema.CATEGORIES.get(column, ()))
+            position = {c: i for i, c in enumerate(categories)}
+            index_type, dtype = _index_type(len(categories))
+            lookup = np.array([-1 if a is None else position[a] for a in answers], dtype=dtype)
+            encoders[column] = ('category', lookup, pa.array(categories, pa.string()))
+            fields.append(pa.field(column, pa.dictionary(index_type, pa.string())))
+
+    digest = hashlib.sha256(f'synthetic:{model.fingerprint}:{n_rows}:{seed}'.encode()).hexdigest()
+    arrow_schema = pa.schema(fields, metadata=snapshot_stamp(digest, options))
+
+    def record_batches():
+        for first_id, codes in model.batches(n_rows, seed, batch_size):
+            n = len(codes[model.order[0]])
+            arrays = [pa.array(np.arange(first_id, first_id + n, dtype=np.int64))]
+            for field in fields[1:]:
+                encoder = encoders[field.name]
+                if encoder[0] == 'mask':
+                    arrays.append(pa.array(encoder[1][codes[field.name]]))
+                else:
+                    indices = encoder[1][codes[field.name]]
+                    arrays.append(pa.DictionaryArray.from_arrays(
+                        pa.array(indices, mask=indices < 0), encoder[2]
+                    ))
+            yield pa.RecordBatch.from_arrays(arrays, schema=arrow_schema)
+
+    return write_snapshot(path, arrow_schema, record_batches())
+
+
+def generate(model, n_rows, path, seed=0, batch_size=DEFAULT_BATCH_SIZE):
+    """Write synthetic respondents to ``path``; the format follows the extension."""
+    if path.endswith('.arrow'):
+        return write_arrow_snapshot(model, n_rows, path, seed, batch_size)
+    if path.endswith('.zip'):
+        return write_csv_zip(model, n_rows, path, seed, batch_size)
+    raise ValueError(f"Unsupported output (expected .csv.zip or .arrow): {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=SOURCE_ZIP, help='real survey zip to learn from')
+    parser.add_argument('--rows', type=int, required=True, help='number of respondents to generate')
+    parser.add_argument('--output', required=True, help='.csv.zip or .arrow file to write')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    model = SurveyModel.from_zip(args.source)
+    for column in model.order:
+        print(f"{column} | {model.parents[column] or '-'}", file=sys.stderr)
+    print(generate(model, args.rows, args.output, args.seed, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,19 @@
 import streamlit as st
-import plotly.express as px
-from utils.client import Client
+from utils.client import get_client
+from utils import profiling
+from utils.charts import figure_json, plotly_chart
 
 def get_ai_usage_data():
     try:
-        response = Client().get_AI_usage()
-        print(response)
-        return response
+        return get_client().get_AI_usage()
     except Exception as e:
         st.error(f"Error fetching data: {e}")
         return None
 
 def create_ai_usage_chart(df):
+    # 只有圖表快取沒命中時才需要 plotly
+    import plotly.express as px
+
     # Correct color mapping
     color_map = {
         'Yes': '#c5e1a5',  # Green for "Yes"
@@ -54,6 +56,8 @@ def create_ai_usage_chart(df):
     return fig
 
 def main():
+    # 使用者看這一頁時先準備下一頁的資料
+    get_client().prefetch_next('1_home')
     # Initialize session state
     if 'current_page' not in st.session_state:
         st.session_state.current_page = '1_home'
@@ -124,9 +128,13 @@ def main():
     
     with right_col:
         if df is not None:
-            chart = create_ai_usage_chart(df)
-            st.plotly_chart(chart, use_container_width=True)
+            # 圖表只取決於資料集，快取完成的 JSON
+            with profiling.stage('figure'):
+                chart = figure_json('home.ai_usage', get_client().version, (),
+                                    lambda: create_ai_usage_chart(df))
+            with profiling.stage('serialize'):
+                plotly_chart(chart, use_container_width=True)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_page(main)
\ No newline at end of file
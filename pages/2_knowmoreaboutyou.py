@@ -1,8 +1,12 @@
 import streamlit as st
-import plotly.graph_objects as go
-from utils.client import Client
+from utils.client import get_client
+from utils import profiling
+from utils.charts import figure_json, plotly_chart
 
 def create_heatmap(data):
+    # 只有圖表快取沒命中時才需要 plotly
+    import plotly.graph_objects as go
+
     fig = go.Figure(data=go.Heatmap(
         z=data.values,
         x=data.columns,
@@ -42,7 +46,8 @@ def create_heatmap(data):
 
 def main():
     # Initialize client
-    client = Client()
+    client = get_client()
+    client.prefetch_next('2_knowmoreaboutyou')
     
     # Get combined distribution data
     distribution_data = client.get_age_employment_distribution()
@@ -127,8 +132,11 @@ def main():
         st.markdown('</div>', unsafe_allow_html=True)
 
     # Create the heatmap
-    heatmap = create_heatmap(distribution_data)
-    st.plotly_chart(heatmap, use_container_width=True)
+    with profiling.stage('figure'):
+        heatmap = figure_json('knowmoreaboutyou.heatmap', client.version, (),
+                              lambda: create_heatmap(distribution_data))
+    with profiling.stage('serialize'):
+        plotly_chart(heatmap, use_container_width=True)
     
     # Add navigation button with custom styling
     
@@ -137,4 +145,4 @@ def main():
     st.markdown('</div>', unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_page(main)
\ No newline at end of file
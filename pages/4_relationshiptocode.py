@@ -1,6 +1,10 @@
 import streamlit as st
+from utils.client import get_client
+from utils import profiling
 
 def main():
+    # 這一頁沒有資料，先準備下一頁的
+    get_client().prefetch_next('4_relationshiptocode')
     # Custom CSS styling
     st.markdown("""
         <style>
@@ -50,4 +54,4 @@ def main():
             st.switch_page("pages/5_selectrelationship.py")
 
 if __name__ == "__main__":
-    main()
+    profiling.run_page(main)
@@ -1,9 +1,66 @@
 import streamlit as st
-import plotly.graph_objects as go
-from utils.client import Client
+from utils.client import get_client
+from utils import profiling
+from utils.charts import figure_json, plotly_chart
+
+def create_heatmap(heatmap_data):
+    # 只有圖表快取沒命中時才需要 plotly
+    import plotly.graph_objects as go
+
+    developer_options = heatmap_data.columns.tolist()
+    education_options = heatmap_data.index.tolist()
+
+    # Convert values to percentages
+    total_responses = heatmap_data.values.sum()
+    heatmap_data_percentage = (heatmap_data / total_responses * 100)
+
+    # Create heatmap using plotly
+    fig = go.Figure(data=go.Heatmap(
+        z=heatmap_data_percentage.values,
+        y=education_options,
+        x=developer_options,
+        colorscale='Greens',
+        text=heatmap_data_percentage.values,
+        texttemplate='%{text:.1f}%',
+        textfont={"size": 12},
+        hoverongaps=False,
+    ))
+
+    # Update layout
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        margin=dict(t=50, b=150, l=10, r=50),
+        xaxis=dict(
+            tickangle=45,
+            tickfont=dict(size=15),
+            gridcolor='rgba(255,255,255,0.1)',
+            ticktext=[label.replace(', ', ',<br>') for label in developer_options],
+            tickvals=list(range(len(developer_options))),
+            side='bottom'
+        ),
+        yaxis=dict(
+            tickfont=dict(size=15),
+            gridcolor='rgba(255,255,255,0.1)',
+            ticktext=[label.split('(')[0] for label in education_options],
+            tickvals=list(range(len(education_options))),
+            side='left',
+        ),
+        height=600,
+        coloraxis_colorbar=dict(
+            title='Percentage',
+            tickfont=dict(color='white'),
+            title_font=dict(color='white'),
+            ticksuffix='%'
+        )
+    )
+
+    return fig
 
 def main():
-    client = Client()
+    client = get_client()
+    client.prefetch_next('5_selectrelationship')
     heatmap_data = client.get_edu_brain_for_heatmap()
     # Define options lists
     developer_options = heatmap_data.columns.tolist()
@@ -51,54 +108,18 @@ def main():
             index=0
         )
 
+    # 下一頁依使用者目前的選擇篩選
+    background = {'MainBranch': developer_index, 'EdLevel': education_index}
+    client.prefetch('get_share_intervals', column='AISent', where=background)
+    client.prefetch('get_share_interval', column='AISent', positive=('Very favorable', 'Favorable'), where=background)
+
     # Add spacing before heatmap
     st.markdown("---")
     
-    # Convert values to percentages
-    total_responses = heatmap_data.values.sum()
-    heatmap_data_percentage = (heatmap_data / total_responses * 100)
-
-    # Create heatmap using plotly
-    fig = go.Figure(data=go.Heatmap(
-        z=heatmap_data_percentage.values,
-        y=education_options,
-        x=developer_options,
-        colorscale='Greens',
-        text=heatmap_data_percentage.values,
-        texttemplate='%{text:.1f}%',
-        textfont={"size": 12},
-        hoverongaps=False,
-    ))
+    with profiling.stage('figure'):
+        fig = figure_json('selectrelationship.heatmap', client.version, (),
+                          lambda: create_heatmap(heatmap_data))
 
-    # Update layout
-    fig.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white'),
-        margin=dict(t=50, b=150, l=10, r=50),
-        xaxis=dict(
-            tickangle=45,
-            tickfont=dict(size=15),
-            gridcolor='rgba(255,255,255,0.1)',
-            ticktext=[label.replace(', ', ',<br>') for label in developer_options],
-            tickvals=list(range(len(developer_options))),
-            side='bottom'
-        ),
-        yaxis=dict(
-            tickfont=dict(size=15),
-            gridcolor='rgba(255,255,255,0.1)',
-            ticktext=[label.split('(')[0] for label in education_options],
-            tickvals=list(range(len(education_options))),
-            side='left',
-        ),
-        height=600,
-        coloraxis_colorbar=dict(
-            title='Percentage',
-            tickfont=dict(color='white'),
-            title_font=dict(color='white'),
-            ticksuffix='%'
-        )
-    )
     # Display heatmap
     st.markdown("""
         <h3 style='text-align: center;'>
@@ -109,7 +130,8 @@ def main():
         </p>
     """, unsafe_allow_html=True)
     
-    st.plotly_chart(fig, use_container_width=True)
+    with profiling.stage('serialize'):
+        plotly_chart(fig, use_container_width=True)
 
     if st.button(
         " ➤ Let's Find Out Their Opinions!   ", 
@@ -124,4 +146,4 @@ def main():
         # Switch to the favorable page
         st.switch_page("pages/6_favorable.py")
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_page(main)
\ No newline at end of file
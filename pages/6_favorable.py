@@ -1,11 +1,19 @@
 import streamlit as st
 import plotly.graph_objects as go
-from utils.client import Client
+from utils.client import get_client
+from utils import profiling
 
+# 算作「認為 AI 工具有幫助」的答案
+FAVORABLE = ('Very favorable', 'Favorable')
+# 少於這個人數時提醒使用者比例的誤差很大
+SMALL_GROUP = 30
 
-def create_pie_chart(data):
-    total = sum(data.values())
-    percentages = {k: (v/total)*100 for k, v in data.items()}
+
+@profiling.staged('figure')
+def create_pie_chart(intervals):
+    # 依比例由大到小，和原本依人數排序相同
+    intervals = intervals.sort_values('percentage', ascending=False, kind='stable')
+    percentages = dict(zip(intervals.index, intervals['percentage']))
     
     # Define color mapping
     color_map = {
@@ -24,6 +32,10 @@ def create_pie_chart(data):
         values=list(percentages.values()),
         hole=.3,
         texttemplate="%{label}: %{value:.1f}%",
+        # 每個比例的 95% 區間
+        customdata=intervals[['low', 'high']].to_numpy(),
+        hovertemplate="%{label}: %{value:.1f}%<br>95% interval %{customdata[0][0]:.1f}% – %{customdata[0][1]:.1f}%<extra></extra>",
+        sort=False,
         textfont=dict(size=14),
         marker=dict(
             colors=colors,  # Use the list of colors instead of the dictionary
@@ -69,31 +81,24 @@ def main():
         </style>
     """, unsafe_allow_html=True)
 
-    client = Client()
+    client = get_client()
+    client.prefetch_next('6_favorable')
     
     # 從 session state 獲取用戶選擇
     user_selections = st.session_state.get('user_selections', {})
     developer_status = user_selections.get('developer_status')
     education_level = user_selections.get('education_level')
     
-    # 獲取數據並過濾
-    favorable_data = client.get_favorable_on_edu_and_code()
+    # 獲取篩選後的情感分布
     if developer_status and education_level:
-        filtered_data = favorable_data[
-            (favorable_data['MainBranch'] == developer_status) &
-            (favorable_data['EdLevel'] == education_level)
-        ]
+        where = {'MainBranch': developer_status, 'EdLevel': education_level}
     else:
-        filtered_data = favorable_data
-    
-    sentiment_counts = filtered_data['AISent'].value_counts().to_dict()
-    print("Filtered data:", filtered_data)
-    print("Sentiment counts:", sentiment_counts)
-    
-    favorable_percentage = (
-        sentiment_counts.get('Very favorable', 0) + 
-        sentiment_counts.get('Favorable', 0)
-    ) / sum(sentiment_counts.values()) * 100 if sentiment_counts else 0
+        where = {}
+    # 選擇依年齡加權時，比例調整成和全部填答者相同的年齡分布
+    stratify_by = 'Age' if st.session_state.get('weight_by_age') else None
+    sentiment_intervals = client.get_share_intervals('AISent', where=where, stratify_by=stratify_by)
+    favorable = client.get_share_interval('AISent', FAVORABLE, where=where, stratify_by=stratify_by)
+    favorable_percentage = favorable['percentage'] if favorable['respondents'] else 0
     
     
     # Create two columns for the layout
@@ -109,6 +114,16 @@ def main():
                 find AI tools highly favorable in their development workflow.</h2>''',
                 unsafe_allow_html=True
             )
+            respondents = int(favorable['respondents'])
+            if respondents:
+                st.caption(
+                    f"95% interval {favorable['low']:.1f}% – {favorable['high']:.1f}%, "
+                    f"based on {respondents:,} respondents"
+                    + (", weighted to the age mix of all respondents" if stratify_by else "")
+                )
+            if respondents < SMALL_GROUP:
+                st.warning("Only a few developers share this background, so this percentage is very uncertain.")
+            st.toggle("Weight by age to match all respondents", key='weight_by_age')
         
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -117,10 +132,12 @@ def main():
             label="",
             label_visibility="collapsed",
             placeholder="Share your opinion", 
-            options=favorable_data['AISent'].dropna().unique(),
+            options=client.count(by=['AISent'])['AISent'],
         )
         # Store the sentiment selection
         st.session_state['user_selections']['sentiment'] = user_sentiment
+        # 下一頁依選擇的看法篩選
+        client.prefetch('count', by=['AIToolCurrently Using'], where={'AISent': user_sentiment})
 
         if st.button(
             " ➤  Let's Find What They Think AI Tools Can Help with!   ", 
@@ -137,8 +154,9 @@ def main():
             st.switch_page("pages/7_knowmoreaboutidea.py")
     
     with right_col:
-        fig = create_pie_chart(sentiment_counts)
-        st.plotly_chart(fig, use_container_width=True)
+        fig = create_pie_chart(sentiment_intervals)
+        with profiling.stage('serialize'):
+            st.plotly_chart(fig, use_container_width=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_page(main)
\ No newline at end of file
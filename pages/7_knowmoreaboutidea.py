@@ -1,13 +1,55 @@
-from utils.client import Client
+import io
+from utils.client import get_client
+from utils import profiling
+from utils.render_cache import render_cache
 import streamlit as st
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 import plotly.express as px
 
+# 文字雲的版面大小；scale 放大輸出，高解析度螢幕上也清楚
+WORDCLOUD_SIZE = (400, 300)
+WORDCLOUD_SCALE = 2
+
+def render_wordcloud(word_freq, width, height, scale):
+    """Render the word cloud as a transparent PNG."""
+    # wordcloud 會載入 matplotlib，只在快取沒命中時才需要
+    from wordcloud import WordCloud
+
+    image = WordCloud(
+        background_color='rgba(0,0,0,0)',
+        mode='RGBA',
+        width=width,
+        height=height,
+        scale=scale,
+        colormap='YlGn',  # Green colormap to match the theme
+        max_words=100,
+        random_state=0,  # 固定版面，同樣的資料產生同樣的圖
+    ).generate_from_frequencies(word_freq).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def get_wordcloud_png(client, sentiment, word_freq):
+    # 只有少數幾種 AISent，每個 (情緒, 資料集版本, 大小) 只畫一次
+    width, height = WORDCLOUD_SIZE
+    key = ('wordcloud', client.version, sentiment, width, height, WORDCLOUD_SCALE)
+    return render_cache.get_or_render(
+        key, lambda: render_wordcloud(word_freq, width, height, WORDCLOUD_SCALE)
+    )
+
 def main():
-    client = Client()
+    client = get_client()
+    client.prefetch_next('7_knowmoreaboutidea')
     benefit_wordcloud = client.get_benefit_wordcloud()
     user_sentiment = st.session_state['user_selections']['sentiment']
+    # 總結頁的兩個人數依使用者的背景和看法篩選
+    selections = st.session_state['user_selections']
+    background = {'MainBranch': selections.get('developer_status'), 'EdLevel': selections.get('education_level')}
+    client.prefetch('count', where=background)
+    client.prefetch('count', where={**background, 'AISent': user_sentiment})
+    # 相似度索引在第一次查詢時才建立，也先在背景建好
+    profile = {'Age': st.session_state.get('user_age'), 'Employment': st.session_state.get('user_employment'), **background}
+    client.prefetch('get_similar_respondents', profile={column: value for column, value in profile.items() if value},
+                    k=100)
     st.markdown("<style>button {height: 80px;}</style>", unsafe_allow_html=True)
     # Add page title using selected sentiment
     st.markdown(f"<h1 style='font-size: 60px;'>Let's see what benefits developers who also think AI tools are <span style='color: #c5e1a5; font-weight: bold;'>{user_sentiment}</span> think AI has.</h1>", unsafe_allow_html=True)
@@ -25,23 +67,9 @@ def main():
         word_freq = filtered_data.loc[:, ['AIBen', 'count']].set_index('AIBen')['count'].to_dict()
         
         if word_freq:
-            # Generate word cloud with updated styling
-            wordcloud = WordCloud(
-                background_color='rgba(0,0,0,0)',
-                mode='RGBA',
-                height=300,
-                colormap='YlGn',  # Green colormap to match the theme
-                max_words=100
-            ).generate_from_frequencies(word_freq)
-            
-            # Display the word cloud with dark theme
-            fig, ax = plt.subplots(facecolor='none')  # Transparent figure background
-            ax.imshow(wordcloud, interpolation='bilinear')
-            ax.axis('off')
-            
-            # Set plot style to match home page
-            plt.style.use('dark_background')
-            fig.patch.set_alpha(0.0)  # Transparent figure background
+            # Rendered once per sentiment and served as a cached PNG
+            with profiling.stage('figure'):
+                wordcloud_png = get_wordcloud_png(client, user_sentiment, word_freq)
             
             # Add custom styling to the Streamlit container
             st.markdown("""
@@ -61,56 +89,59 @@ def main():
                 </style>
             """, unsafe_allow_html=True)
             
-            st.pyplot(fig)
+            with profiling.stage('serialize'):
+                st.image(wordcloud_png, use_container_width=True)
         else:
             st.warning("No data available for the selected sentiment filter.")
 
 
     with right_col:
         st.markdown("<h3 style='font-size: 20px; text-align: center;'>These Developers are using AI tools for ...</h3>", unsafe_allow_html=True)
-        AI_tool_currently_using = client.get_AI_tool_currently_using()
-        AI_tool_currently_using = AI_tool_currently_using[AI_tool_currently_using['AISent'] == user_sentiment]
-        AI_tool_currently_using = AI_tool_currently_using.groupby('AIToolCurrently Using').size().reset_index(name='count').sort_values(by='count', ascending=True)
+        AI_tool_currently_using = client.count(
+            by=['AIToolCurrently Using'], where={'AISent': user_sentiment}
+        ).sort_values(by='count', ascending=True)
         # 建立長條圖
-        fig = px.bar(
-            AI_tool_currently_using,
-            x='count',
-            y='AIToolCurrently Using',
-            orientation='h',
-            labels={'count': '', 'AIToolCurrently Using': ''},
-            text='count'
-        )
-        
-        # 設定圖表樣式
-        fig.update_traces(
-            textposition='outside',
-            marker_color='#c5e1a5',  # 改用相同的綠色主題
-            textfont=dict(
-                size=14,
-                color='#ffffff'  # 白色文字
+        with profiling.stage('figure'):
+            fig = px.bar(
+                AI_tool_currently_using,
+                x='count',
+                y='AIToolCurrently Using',
+                orientation='h',
+                labels={'count': '', 'AIToolCurrently Using': ''},
+                text='count'
             )
-        )
         
-        fig.update_layout(
-            showlegend=False,
-            plot_bgcolor='rgba(0,0,0,0)',  # 透明背景
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='#ffffff',  # 白色字體
-            height=max(500, len(AI_tool_currently_using) * 30),
-            yaxis=dict(
-                showgrid=False,
-                tickfont=dict(color='#ffffff')
-            ),
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(255,255,255,0.1)',  # 淡白色網格
-                tickfont=dict(color='#ffffff')
-            ),
-            margin=dict(t=50, b=100)
-        )
+            # 設定圖表樣式
+            fig.update_traces(
+                textposition='outside',
+                marker_color='#c5e1a5',  # 改用相同的綠色主題
+                textfont=dict(
+                    size=14,
+                    color='#ffffff'  # 白色文字
+                )
+            )
+
+            fig.update_layout(
+                showlegend=False,
+                plot_bgcolor='rgba(0,0,0,0)',  # 透明背景
+                paper_bgcolor='rgba(0,0,0,0)',
+                font_color='#ffffff',  # 白色字體
+                height=max(500, len(AI_tool_currently_using) * 30),
+                yaxis=dict(
+                    showgrid=False,
+                    tickfont=dict(color='#ffffff')
+                ),
+                xaxis=dict(
+                    showgrid=True,
+                    gridcolor='rgba(255,255,255,0.1)',  # 淡白色網格
+                    tickfont=dict(color='#ffffff')
+                ),
+                margin=dict(t=50, b=100)
+            )
         
         # 顯示圖表
-        st.plotly_chart(fig, use_container_width=True)
+        with profiling.stage('serialize'):
+            st.plotly_chart(fig, use_container_width=True)
     # Add navigation button at the bottom
     
     if st.button("➤ LET'S HEADING TO DESTINATION OF SURVEY", use_container_width=True ,):
@@ -118,4 +149,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_page(main)
\ No newline at end of file
@@ -1,9 +1,14 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.client import Client
+from utils.client import get_client
+from utils import profiling
 import pandas as pd
 
+# 「最相似的填答者」取幾位
+SIMILAR_RESPONDENTS = 100
+
+@profiling.staged('figure')
 def create_sentiment_pie(sentiment_counts):
     # Define color mapping
     color_map = {
@@ -45,6 +50,7 @@ def create_sentiment_pie(sentiment_counts):
     
     return fig
 
+@profiling.staged('figure')
 def create_tools_bar(tool_counts):
     fig = go.Figure()
     
@@ -94,14 +100,13 @@ def main():
     st.title("Your AI Tools Survey Journey Summary 🚀")
     
     user_selections = st.session_state.get('user_selections', {})
-    client = Client()
+    client = get_client()
     
-    # Get filtered data
-    favorable_data = client.get_favorable_on_edu_and_code()
-    filtered_data = favorable_data[
-        (favorable_data['MainBranch'] == user_selections.get('developer_status')) & 
-        (favorable_data['EdLevel'] == user_selections.get('education_level'))
-    ]
+    # Filter for developers sharing the user's background
+    background = {
+        'MainBranch': user_selections.get('developer_status'),
+        'EdLevel': user_selections.get('education_level'),
+    }
     
     # Profile and Key Metrics
     col1, col2, col3 = st.columns([2, 1, 1])
@@ -123,7 +128,7 @@ def main():
             sentiment=user_selections.get('sentiment', 'N/A').lower()
         ), unsafe_allow_html=True)
     
-    total_filtered = len(filtered_data)
+    total_filtered = client.count(where=background)['count'].iloc[0]
     with col2:
         st.markdown("#### Similar Developers")
         st.markdown(f"""
@@ -131,7 +136,9 @@ def main():
             share your background
         """, unsafe_allow_html=True)
     
-    sentiment_match = len(filtered_data[filtered_data['AISent'] == user_selections.get('sentiment')])
+    sentiment_match = client.count(
+        where={**background, 'AISent': user_selections.get('sentiment')}
+    )['count'].iloc[0]
     with col3:
         st.markdown("#### Similar Sentiment")
         st.markdown(f"""
@@ -144,50 +151,53 @@ def main():
     
     with col2:
         st.markdown("### 📊 Sentiment Distribution")
-        sentiment_counts = filtered_data['AISent'].value_counts()
+        sentiment_counts = client.count(by=['AISent'], where=background).set_index('AISent')['count']
         fig = create_sentiment_pie(sentiment_counts)
-        st.plotly_chart(fig, use_container_width=True)
+        with profiling.stage('serialize'):
+            st.plotly_chart(fig, use_container_width=True)
     
     with col1:
-        AI_tools_data = client.get_AI_tool_currently_using()
-        filtered_tools = AI_tools_data[
-            AI_tools_data['AISent'] == user_selections.get('sentiment')
-        ]
-        tool_counts = filtered_tools['AIToolCurrently Using'].value_counts().head(5).sort_values(ascending=True)
-        total_tools_responses = len(filtered_tools)
+        tool_counts = client.count(
+            by=['AIToolCurrently Using'],
+            where={'AISent': user_selections.get('sentiment')},
+        ).set_index('AIToolCurrently Using')['count']
+        total_tools_responses = tool_counts.sum()
+        tool_counts = tool_counts.head(5).sort_values(ascending=True)
         st.markdown(f"### 🛠️ Popular AI Tools <span style='font-size: 14px; color: #888888;'>(Total: {total_tools_responses})</span>", unsafe_allow_html=True)
         
         # 計算工具使用的百分比
         tool_percentages = (tool_counts / total_tools_responses * 100).round(1)
         
-        fig = go.Figure()
-        fig.add_trace(go.Bar(
-            y=tool_counts.index,
-            x=tool_percentages,  # 使用百分比而不是原始計數
-            orientation='h',
-            marker_color='#c5e1a5',
-            text=[f'{pct}%' for pct in tool_percentages],  # 顯示百分比
-            textposition='outside'
-        ))
+        with profiling.stage('figure'):
+            fig = go.Figure()
+            fig.add_trace(go.Bar(
+                y=tool_counts.index,
+                x=tool_percentages,  # 使用百分比而不是原始計數
+                orientation='h',
+                marker_color='#c5e1a5',
+                text=[f'{pct}%' for pct in tool_percentages],  # 顯示百分比
+                textposition='outside'
+            ))
         
-        fig.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='#ffffff',
-            height=400,
-            margin=dict(l=30, r=50, t=20, b=20),  # 增加右邊距以容納標籤
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(255,255,255,0.1)',
-                title=None,
-                range=[0, max(tool_percentages) * 1.2]  # 調整範圍以適應百分比
-            ),
-            yaxis=dict(
-                showgrid=False,
-                title=None
+            fig.update_layout(
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font_color='#ffffff',
+                height=400,
+                margin=dict(l=30, r=50, t=20, b=20),  # 增加右邊距以容納標籤
+                xaxis=dict(
+                    showgrid=True,
+                    gridcolor='rgba(255,255,255,0.1)',
+                    title=None,
+                    range=[0, max(tool_percentages) * 1.2]  # 調整範圍以適應百分比
+                ),
+                yaxis=dict(
+                    showgrid=False,
+                    title=None
+                )
             )
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        with profiling.stage('serialize'):
+            st.plotly_chart(fig, use_container_width=True)
 
     # Benefits Analysis
     benefits_data = client.get_benefit_wordcloud()
@@ -209,6 +219,34 @@ def main():
                 {row['AIBen']}
             """, unsafe_allow_html=True)
 
+    # 不只比對完全相同的背景：以年齡、就業、開發者身分和學歷找最相似的填答者
+    profile = {
+        'Age': st.session_state.get('user_age'),
+        'Employment': st.session_state.get('user_employment'),
+        'MainBranch': user_selections.get('developer_status'),
+        'EdLevel': user_selections.get('education_level'),
+    }
+    profile = {column: value for column, value in profile.items() if value}
+    if profile:
+        similar = client.get_similar_respondents(profile, k=SIMILAR_RESPONDENTS)
+        sentiment = similar['sentiment'].set_index('AISent')['percentage']
+        favorable_share = sentiment.reindex(['Very favorable', 'Favorable']).fillna(0).sum()
+        st.markdown(f"### 🧭 The {SIMILAR_RESPONDENTS} Developers Most Like You", unsafe_allow_html=True)
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.markdown(f"""
+                <div class='metric-value'>{favorable_share:.0f}%</div>
+                find AI tools favorable
+            """, unsafe_allow_html=True)
+        with col2:
+            tool_cols = st.columns(3)
+            for idx, (_, row) in enumerate(similar['tools'].head(3).iterrows()):
+                with tool_cols[idx]:
+                    st.markdown(f"""
+                        <div class='metric-value'>{row['percentage']:.0f}%</div>
+                        use AI for {row['AIToolCurrently Using'].lower()}
+                    """, unsafe_allow_html=True)
+
     # Navigation buttons
     st.markdown("<br>", unsafe_allow_html=True)
     col1, col2 = st.columns(2)
@@ -219,4 +257,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_page(main)
\ No newline at end of file
@@ -0,0 +1,46 @@
+import os
+import sys
+
+# 測試以專案根目錄為 import 路徑，和 streamlit run app.py 相同
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import MODELLED, SurveyModel, write_arrow_snapshot
+from utils import schema
+
+# 合成資料使用的年度，不會和真實的問卷年度衝突
+SYNTHETIC_YEAR = 2099
+
+
+def _seed_answers(n, rng):
+    # 從文件記載的答案抽樣，當作合成模型的學習資料；約一成未作答
+    answers = {}
+    for column in MODELLED:
+        if column in schema.MULTI_SELECT:
+            options = np.array(schema.MULTI_SELECT[column][:5], dtype=object)
+            picks = rng.random((n, len(options))) < 0.4
+            values = [';'.join(options[row]) or None for row in picks]
+        else:
+            values = list(rng.choice(schema.CATEGORIES[column][:4], n))
+        answers[column] = [None if rng.random() < 0.1 else value for value in values]
+    return pd.DataFrame(answers)
+
+
+@pytest.fixture(scope='session')
+def synthetic_dir(tmp_path_factory):
+    """A directory holding a synthetic snapshot of ``SYNTHETIC_YEAR`` (3000 respondents)."""
+    directory = tmp_path_factory.mktemp('survey')
+    model = SurveyModel.fit(_seed_answers(500, np.random.default_rng(0)))
+    write_arrow_snapshot(model, 3000, str(directory / f'survey_results_public_{SYNTHETIC_YEAR}.arrow'),
+                         batch_size=1000)
+    return directory
+
+
+@pytest.fixture
+def synthetic_year(synthetic_dir, monkeypatch):
+    """Run the test in ``synthetic_dir`` so ``Client`` and ``StreamingSurvey`` find its snapshot."""
+    monkeypatch.chdir(synthetic_dir)
+    return SYNTHETIC_YEAR
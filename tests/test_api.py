@@ -0,0 +1,42 @@
+import json
+from urllib.parse import urlencode
+
+import pytest
+from tornado.testing import AsyncHTTPTestCase
+
+from utils.api import make_app
+
+
+class ResultHandlerTest(AsyncHTTPTestCase):
+    @pytest.fixture(autouse=True)
+    def _synthetic(self, synthetic_year):
+        self.year = synthetic_year
+
+    def get_app(self):
+        return make_app()
+
+    def fetch_result(self, name, headers=None, **arguments):
+        query = urlencode({'year': self.year, **arguments}, doseq=True)
+        return self.fetch(f'/api/{name}?{query}', headers=headers)
+
+    def test_unchanged_result_is_not_modified(self):
+        response = self.fetch_result('count', by='AISent')
+        assert response.code == 200
+        again = self.fetch_result('count', {'If-None-Match': response.headers['ETag']}, by='AISent')
+        assert again.code == 304
+
+    def test_invalid_arguments_are_rejected_even_when_the_etag_matches(self):
+        etag = self.fetch_result('count', by='AISent').headers['ETag']
+        for name, arguments in [
+            ('count', {'by': 'NoSuchColumn'}),
+            ('count', {'by': 'ResponseId'}),
+            ('count', {'by': 'AISent', 'where.Age': 'Not an age'}),
+            ('count', {'by': 'AISent', 'multi': 'some'}),
+            ('get_share_interval', {'column': 'AISent'}),
+            ('get_share_intervals', {'column': 'AIBen'}),
+            ('get_similar_respondents', {'profile.AISent': 'Favorable'}),
+            ('get_similar_respondents', {'profile.Age': '25-34 years old', 'k': 0}),
+        ]:
+            response = self.fetch_result(name, {'If-None-Match': etag}, **arguments)
+            assert response.code == 400, (name, arguments)
+            assert json.loads(response.body)['error']
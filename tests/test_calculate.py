@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+from utils.calculate import Calculate
+
+SENTIMENTS = ['Favorable', 'Unfavorable']
+
+
+def _answers(*values, age=None):
+    data = {'AISent': pd.Categorical(values, categories=SENTIMENTS)}
+    if age is not None:
+        data['Age'] = pd.Categorical(age)
+    return pd.DataFrame(data)
+
+
+def test_share_interval_is_wide_when_every_respondent_agrees():
+    result = Calculate().calculate_share_interval(_answers(*['Favorable'] * 3), 'AISent', ('Favorable',))
+
+    assert result['percentage'] == 100
+    assert result['high'] == 100
+    assert result['low'] < 75
+    assert result['respondents'] == 3
+
+
+def test_share_interval_is_wide_when_no_respondent_agrees():
+    result = Calculate().calculate_share_interval(_answers(*['Unfavorable'] * 2), 'AISent', ('Favorable',))
+
+    assert result['percentage'] == 0
+    assert result['low'] == 0
+    assert result['high'] > 25
+
+
+def test_share_interval_narrows_with_more_respondents():
+    calculate = Calculate()
+    small = calculate.calculate_share_interval(_answers('Favorable', 'Unfavorable'), 'AISent', ('Favorable',))
+    large = calculate.calculate_share_interval(_answers(*['Favorable', 'Unfavorable'] * 500), 'AISent', ('Favorable',))
+
+    assert small['percentage'] == large['percentage'] == 50
+    assert large['high'] - large['low'] < small['high'] - small['low']
+
+
+def test_share_intervals_cover_every_answer_and_match_the_single_share():
+    data = _answers('Favorable', 'Favorable', 'Unfavorable', 'Favorable',
+                    age=['young', 'old', 'old', 'young'])
+    calculate = Calculate()
+    intervals = calculate.calculate_share_intervals(data, 'AISent', stratify_by='Age')
+    favorable = calculate.calculate_share_interval(data, 'AISent', ('Favorable',), stratify_by='Age')
+
+    assert list(intervals.index) == SENTIMENTS
+    assert intervals['percentage'].sum() == pytest.approx(100)
+    assert (intervals['low'] < intervals['percentage']).all()
+    assert (intervals['high'] > intervals['percentage']).all()
+    assert intervals.loc['Favorable', 'percentage'] == pytest.approx(favorable['percentage'])
+
+
+def test_share_intervals_count_respondents_as_integers_even_when_empty():
+    calculate = Calculate()
+    data = _answers('Favorable', 'Unfavorable', age=['young', 'old'])
+    populated = calculate.calculate_share_intervals(data, 'AISent')
+    empty = calculate.calculate_share_intervals(data, 'AISent', (('Age', ('unknown',)),))
+
+    assert empty.empty
+    assert populated.dtypes.equals(empty.dtypes)
+    assert populated['respondents'].dtype == 'int64'
+    assert isinstance(calculate.calculate_share_interval(data, 'AISent', ('Favorable',))['respondents'], int)
+
+
+@pytest.mark.parametrize('arguments, error', [
+    ({'column': 'Missing'}, KeyError),
+    ({'column': 'ResponseId'}, ValueError),
+    ({'column': 'AISent', 'stratify_by': 'ResponseId'}, ValueError),
+    ({'column': 'AISent', 'stratify_by': 'Missing'}, KeyError),
+])
+def test_share_intervals_reject_columns_that_are_not_categorical(arguments, error):
+    data = _answers('Favorable', 'Unfavorable', age=['young', 'old']).assign(ResponseId=[1, 2])
+    calculate = Calculate()
+
+    with pytest.raises(error):
+        calculate.calculate_share_intervals(data, **arguments)
+    with pytest.raises(error):
+        calculate.calculate_share_interval(data, positive=('Favorable',), **arguments)
+
+
+def test_share_intervals_reject_multi_select_columns():
+    data = _answers('Favorable', 'Unfavorable').assign(AIBen=[1, 2])
+    calculate = Calculate(options={'AIBen': ['Greater efficiency', 'Speed up learning']})
+
+    with pytest.raises(ValueError):
+        calculate.calculate_share_intervals(data, 'AIBen')
+    # 多選題可以當篩選條件
+    assert calculate.calculate_share_intervals(data, 'AISent', (('AIBen', ('Greater efficiency',)),))['respondents'].iloc[0] == 1
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+import streamlit.elements.lib.utils
+
+from utils import charts
+
+SPEC = json.dumps({'data': [{'type': 'bar', 'x': ['a'], 'y': [1]}], 'layout': {}})
+
+
+@pytest.mark.parametrize('error', [AttributeError, TypeError])
+def test_plotly_chart_falls_back_when_streamlit_internals_change(monkeypatch, error):
+    def changed(*args, **kwargs):
+        raise error('changed in another streamlit version')
+
+    calls = []
+    monkeypatch.setattr(streamlit.elements.lib.utils, 'compute_and_register_element_id', changed)
+    monkeypatch.setattr(charts.st, 'plotly_chart', lambda figure, **kwargs: calls.append((figure, kwargs)))
+
+    charts.plotly_chart(SPEC)
+
+    assert calls == [(json.loads(SPEC), {'use_container_width': True})]
+
+
+def test_plotly_chart_uses_the_public_api_on_other_streamlit_versions(monkeypatch):
+    def private_path(*args, **kwargs):
+        raise AssertionError('the private path must not run on other versions')
+
+    calls = []
+    monkeypatch.setattr(charts.st, '__version__', '1.99.0')
+    monkeypatch.setattr(charts, '_enqueue_spec', private_path)
+    monkeypatch.setattr(charts.st, 'plotly_chart', lambda figure, **kwargs: calls.append(figure))
+
+    charts.plotly_chart(SPEC)
+
+    assert calls == [json.loads(SPEC)]
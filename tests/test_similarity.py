@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from utils.similarity import SimilarityIndex
+
+AGES = ['18-24 years old', '25-34 years old']
+
+
+@pytest.fixture
+def index():
+    data = pd.DataFrame({
+        'ResponseId': [1, 2, 3],
+        'Age': pd.Categorical(['18-24 years old', '25-34 years old', '25-34 years old'], categories=AGES),
+        'AISent': pd.Categorical(['Favorable', 'Unfavorable', 'Favorable']),
+    })
+    return SimilarityIndex.build(data, {})
+
+
+def test_a_single_answer_is_matched_whole_not_as_a_substring(index):
+    whole, _ = index.encode([('Age', '25-34 years old')])
+    listed, _ = index.encode([('Age', ['25-34 years old'])])
+
+    assert (whole == listed).all()
+    rows, distances = index.nearest([('Age', '25-34 years old')], k=2)
+    assert sorted(rows) == [1, 2]
+    assert list(distances) == [0, 0]
+
+
+@pytest.mark.parametrize('values', ['25-34', ['25-34 years old', 'Over 100']])
+def test_unknown_answers_are_rejected(index, values):
+    with pytest.raises(ValueError):
+        index.encode([('Age', values)])
+
+
+def test_unknown_columns_are_rejected(index):
+    with pytest.raises(KeyError):
+        index.encode([('AISelect', 'Yes')])
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from utils.client import Client
+from utils.streaming import GETTER_COLUMNS, StreamingSurvey
+
+COUNTS = [
+    {'by': ['AISent']},
+    {'by': ['AIToolCurrently Using'], 'where': {'AISent': 'Favorable'}},
+    {'by': ['Age', 'AIBen'], 'where': {'AIBen': ['Greater efficiency', 'Speed up learning']}, 'multi': 'all'},
+    # 同一欄位同時在 by 和 where 裡
+    {'by': ['AIBen'], 'where': {'AIBen': 'Greater efficiency'}},
+]
+
+
+@pytest.fixture
+def surveys(synthetic_year):
+    # batch 比資料集小，確保結果是跨 batch 累加出來的
+    return StreamingSurvey(synthetic_year, batch_size=700), Client(synthetic_year)
+
+
+def _assert_equal(streamed, loaded):
+    if isinstance(loaded, pd.DataFrame):
+        pd.testing.assert_frame_equal(streamed, loaded)
+    elif isinstance(loaded, pd.Series):
+        pd.testing.assert_series_equal(streamed, loaded)
+    elif isinstance(loaded, dict):
+        assert streamed.keys() == loaded.keys()
+        for key in loaded:
+            _assert_equal(streamed[key], loaded[key])
+    else:
+        assert streamed == loaded
+
+
+@pytest.mark.parametrize('getter', sorted(GETTER_COLUMNS))
+def test_streaming_getters_match_client(surveys, getter):
+    streaming, client = surveys
+    _assert_equal(getattr(streaming, getter)(), getattr(client, getter)())
+
+
+@pytest.mark.parametrize('query', COUNTS)
+def test_streaming_count_matches_client(surveys, query):
+    streaming, client = surveys
+    pd.testing.assert_frame_equal(streaming.count(**query), client.count(**query))
@@ -0,0 +1,315 @@
+"""HTTP/JSON API over the ``Client`` results, without Streamlit.
+
+Every ``Client.get_*`` result and ``Client.count`` is served as JSON under
+``/api/<method>``, for dashboards that embed the survey numbers::
+
+    python -m utils.api --port 8600
+
+    GET /api                                        years and endpoints
+    GET /api/get_AI_usage?year=2023
+    GET /api/count?by=AISent&where.Age=25-34 years old
+    GET /api/get_share_interval?column=AISent&positive=Favorable&positive=Very favorable&stratify_by=Age
+    GET /api/get_similar_respondents?profile.Age=25-34 years old&k=50
+    GET /metrics                                    telemetry in Prometheus text format
+
+List arguments repeat the parameter (``by=AISent&by=Age``); mapping
+arguments (``where``, ``profile``) use one ``<argument>.<column>``
+parameter per column, repeated for several values. ``year`` defaults to
+``DEFAULT_YEAR`` (the year the pages show).
+
+The server is a single Tornado IOLoop; the computations run on a thread
+pool of ``SURVEY_API_WORKERS`` threads (default 8) against the same
+process-wide ``get_client()`` and result cache as the pages, so a dataset
+is loaded once and concurrent requests for the same result compute it
+once. The encoded JSON is kept in the result cache as well. Responses carry
+the dataset version and the code version (``render_cache.CODE_VERSION``) as
+their ``ETag``, with ``Cache-Control: no-cache``: a request whose
+``If-None-Match`` still matches gets ``304 Not Modified`` without computing
+or serializing anything, and a deploy that changes a computation
+invalidates every tag. Arguments are checked against the year's columns
+and answers before the tags are compared, so an invalid request gets
+``400`` even when its ``If-None-Match`` matches.
+"""
+import argparse
+import inspect
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import tornado.ioloop
+import tornado.web
+
+from utils import telemetry
+from utils.cache import cached_result
+from utils.client import get_client, loaded_years
+from utils.partitions import DEFAULT_YEAR, available_years
+from utils.render_cache import CODE_VERSION
+from utils.similarity import METRICS, PROFILE_COLUMNS
+
+# 執行計算的 thread 數，可用環境變數 SURVEY_API_WORKERS 調整
+API_WORKERS = int(os.environ.get('SURVEY_API_WORKERS', '8'))
+
+# 參數 -> 型別；dict 參數以 <參數>.<欄位> 傳入
+ARGUMENTS = {
+    'column': str,
+    'positive': list,
+    'stratify_by': str,
+    'where': dict,
+    'profile': dict,
+    'by': list,
+    'multi': str,
+    'k': int,
+    'metric': str,
+}
+
+# 公開的 Client 方法 -> 可接受的參數
+# （get_employment_usage 依賴的計算目前不存在，所以不公開）
+ENDPOINTS = {
+    'get_AI_usage': (),
+    'get_age_usage': (),
+    'get_age_employment_distribution': (),
+    'get_ai_usage_percentage': (),
+    'get_edu_brain_for_heatmap': (),
+    'get_favorable_on_edu_and_code': (),
+    'get_benefit_wordcloud': (),
+    'get_AI_tool_currently_using': (),
+    'get_share_interval': ('column', 'positive', 'where', 'stratify_by'),
+    'get_share_intervals': ('column', 'where', 'stratify_by'),
+    'get_poststratification_weights': ('column', 'stratify_by', 'where'),
+    'get_similar_respondents': ('profile', 'k', 'metric'),
+    'count': ('by', 'where', 'multi'),
+}
+
+_executor = ThreadPoolExecutor(API_WORKERS, thread_name_prefix='survey-api')
+
+
+def _records(frame):
+    # 有名稱的 index（例如交叉表的列）變成欄位，流水號 index 直接丟掉
+    if any(name is not None for name in frame.index.names):
+        return frame.reset_index()
+    return frame.reset_index(drop=True)
+
+
+def to_json(value):
+    """JSON text of a ``Client`` result.
+
+    DataFrames become lists of records (a named index becomes a column),
+    Series with an unnamed index become objects, dicts are encoded value by
+    value; missing values are ``null``.
+    """
+    if isinstance(value, pd.DataFrame):
+        return _records(value).to_json(orient='records', force_ascii=False)
+    if isinstance(value, pd.Series):
+        if all(name is None for name in value.index.names):
+            return value.to_json(orient='index', force_ascii=False)
+        return to_json(value.to_frame(value.name or 'value'))
+    if isinstance(value, dict):
+        return '{' + ','.join(f'{json.dumps(str(k), ensure_ascii=False)}:{to_json(v)}'
+                              for k, v in value.items()) + '}'
+    return json.dumps(value, ensure_ascii=False)
+
+
+def parse_arguments(name, query):
+    """Keyword arguments of endpoint ``name`` from the query string (``{parameter: [values]}``)."""
+    allowed = ENDPOINTS[name]
+    kwargs = {}
+    for parameter, values in query.items():
+        argument, _, column = parameter.partition('.')
+        if argument == 'year':
+            continue
+        if argument not in allowed or (ARGUMENTS[argument] is dict) != bool(column):
+            raise ValueError(f"{name} does not take {parameter!r}")
+        kind = ARGUMENTS[argument]
+        if kind is dict:
+            kwargs.setdefault(argument, {})[column] = values[0] if len(values) == 1 else values
+        elif kind is list:
+            kwargs[argument] = values
+        elif len(values) > 1:
+            raise ValueError(f"{parameter!r} takes one value")
+        else:
+            kwargs[argument] = kind(values[0])
+    return kwargs
+
+
+def _labels(client, column):
+    # 欄位的答案（類別或多選題選項）；只能用類別欄位和多選題 bitmask 欄位
+    data, options = client.data_loader.data, client.data_loader.options
+    if column not in data.columns:
+        raise KeyError(f"Unknown column: {column!r}")
+    if column in options:
+        return [str(option) for option in options[column]]
+    if not isinstance(data[column].dtype, pd.CategoricalDtype):
+        raise ValueError(f"{column!r} is not a categorical or multi-select column")
+    return [str(category) for category in data[column].cat.categories]
+
+
+def _check_values(client, column, values):
+    labels = _labels(client, column)
+    for value in [values] if isinstance(values, str) else values:
+        if value not in labels:
+            raise ValueError(f"Unknown answer {value!r} for {column!r}")
+
+
+def validate_arguments(client, name, kwargs):
+    """Raise KeyError / ValueError / TypeError for arguments ``client`` cannot answer, without computing anything."""
+    # 缺少必要參數時 bind 會丟出 TypeError
+    inspect.signature(getattr(client, name)).bind(**kwargs)
+    for column in kwargs.get('by', ()):
+        _labels(client, column)
+    for column, values in kwargs.get('where', {}).items():
+        _check_values(client, column, values)
+    for argument in ('column', 'stratify_by'):
+        if argument in kwargs:
+            column = kwargs[argument]
+            _labels(client, column)
+            if column in client.data_loader.options:
+                raise ValueError(f"{argument} must be a single-select column, got {column!r}")
+    if 'positive' in kwargs and 'column' in kwargs:
+        _check_values(client, kwargs['column'], kwargs['positive'])
+    for column, values in kwargs.get('profile', {}).items():
+        if column not in PROFILE_COLUMNS:
+            raise KeyError(f"Not a profile column: {column!r}")
+        _check_values(client, column, values)
+    if kwargs.get('multi', 'any') not in ('any', 'all'):
+        raise ValueError(f"multi must be 'any' or 'all', got {kwargs['multi']!r}")
+    if kwargs.get('metric', METRICS[0]) not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}, got {kwargs['metric']!r}")
+    if kwargs.get('k', 1) < 1:
+        raise ValueError(f"k must be positive, got {kwargs['k']}")
+
+
+def _bad_request(error):
+    # KeyError 的 str() 會多一層引號
+    message = error.args[0] if isinstance(error, KeyError) and error.args else error
+    return tornado.web.HTTPError(400, '%s', message)
+
+
+class _Response:
+    """Encoded results of one ``Client``, in the shared result cache under its dataset version."""
+
+    def __init__(self, client):
+        self.client = client
+        self.version = client.version
+
+    @cached_result
+    def body(self, name, arguments):
+        kwargs = {argument: dict(value) if ARGUMENTS[argument] is dict else value for argument, value in arguments}
+        return to_json(getattr(self.client, name)(**kwargs)).encode()
+
+
+def _freeze(kwargs):
+    # 參數 -> 可以當快取 key 的 tuple
+    def freeze(value):
+        if isinstance(value, dict):
+            return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+        return tuple(value) if isinstance(value, list) else value
+    return tuple(sorted((argument, freeze(value)) for argument, value in kwargs.items()))
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def set_default_headers(self):
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+
+    def write_error(self, status_code, **kwargs):
+        # 錯誤訊息放在 body，status line 只用標準的 reason
+        error = kwargs.get('exc_info', (None, None, None))[1]
+        if isinstance(error, tornado.web.HTTPError) and error.log_message:
+            message = error.log_message % error.args
+        else:
+            message = self._reason
+        self.finish(json.dumps({'error': message}, ensure_ascii=False))
+
+    async def run(self, func, *args):
+        return await tornado.ioloop.IOLoop.current().run_in_executor(_executor, func, *args)
+
+
+class IndexHandler(BaseHandler):
+    def get(self):
+        self.finish(json.dumps({
+            'years': available_years(),
+            'loaded_years': loaded_years(),
+            'default_year': DEFAULT_YEAR,
+            'endpoints': {name: list(arguments) for name, arguments in ENDPOINTS.items()},
+        }))
+
+
+class ResultHandler(BaseHandler):
+    _etag = None
+
+    async def get(self, name):
+        if name not in ENDPOINTS:
+            raise tornado.web.HTTPError(404, 'Unknown endpoint: %s', name)
+        year = self.get_query_argument('year', str(DEFAULT_YEAR))
+        year = int(year) if year.isdigit() else year
+        if year not in available_years():
+            raise tornado.web.HTTPError(404, 'No survey data for year %s', year)
+        try:
+            kwargs = parse_arguments(name, {
+                parameter: [value.decode() for value in values]
+                for parameter, values in self.request.query_arguments.items()
+            })
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, '%s', e)
+
+        # 第一個要求某年度的 request 載入資料，同時進來的其他 request 等它載入完成
+        client = await self.run(get_client, year)
+        # 先檢查參數，不合法的 request 即使 ETag 相符也回 400
+        try:
+            validate_arguments(client, name, kwargs)
+        except (KeyError, ValueError, TypeError) as e:
+            raise _bad_request(e)
+        if client.version is not None:
+            self._etag = f'"{client.version}-{CODE_VERSION}"'
+            self.set_header('Cache-Control', 'no-cache')
+            self.set_etag_header()
+            if self.check_etag_header():
+                self.set_status(304)
+                return
+        try:
+            body = await self.run(_Response(client).body, name, _freeze(kwargs))
+        except (KeyError, ValueError, TypeError) as e:
+            raise _bad_request(e)
+        self.finish(body)
+
+    def compute_etag(self):
+        # 結果只取決於資料集版本、程式碼版本（和 URL），計算之前就能比對 If-None-Match
+        return self._etag
+
+    def on_finish(self):
+        endpoint = self.path_kwargs.get('name', '')
+        telemetry.count('survey_api_requests_total', endpoint=endpoint, status=self.get_status())
+        telemetry.observe('survey_api_request_seconds', self.request.request_time(), endpoint=endpoint)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.finish(telemetry.prometheus_text())
+
+
+def make_app(**settings):
+    return tornado.web.Application([
+        (r'/api/?', IndexHandler),
+        (r'/api/(?P<name>\w+)', ResultHandler),
+        (r'/metrics', MetricsHandler),
+    ], compress_response=True, **settings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SURVEY_API_PORT', '8600')))
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--preload', type=int, nargs='*', default=[DEFAULT_YEAR],
+                        help='survey years to load before accepting requests')
+    args = parser.parse_args(argv)
+
+    for year in args.preload:
+        get_client(year)
+    make_app().listen(args.port, args.address)
+    print(f"Serving the survey API on http://{args.address}:{args.port}/api")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import numpy as np
+
+from utils import schema
+
+
+def popcount(bits):
+    """Number of set bits in a packed bitmap."""
+    return int(np.bitwise_count(bits).sum())
+
+
+class BitmapIndex:
+    """One packed bitmap per (column, value) over the respondents.
+
+    Bit ``r`` of ``bitmap(column, value)`` is set when respondent ``r``
+    answered ``value`` (or picked it, for multi-select columns). Filters are
+    AND/OR of bitmaps and counts are popcounts, so a drill-down touches
+    n / 8 bytes per criterion instead of scanning the columns.
+    """
+
+    def __init__(self, n_rows, labels, bitmaps, multi=()):
+        self.n_rows = n_rows
+        # 欄位 -> 值的標籤
+        self.labels = labels
+        # 欄位 -> (值的數量, n_rows / 8) 的 uint8 陣列
+        self.bitmaps = bitmaps
+        # 多選題欄位
+        self.multi = frozenset(multi)
+        self._positions = {
+            column: {label: i for i, label in enumerate(column_labels)}
+            for column, column_labels in labels.items()
+        }
+        n_bytes = (n_rows + 7) // 8
+        self._none = np.zeros(n_bytes, dtype=np.uint8)
+        self._all = np.packbits(np.ones(n_rows, dtype=bool), bitorder='little')
+
+    @classmethod
+    def build(cls, df, options):
+        """Index every categorical and multi-select bitmask column of ``df``."""
+        labels = {}
+        bitmaps = {}
+        for column in df.columns:
+            if column in options:
+                column_labels = list(options[column])
+                bits = schema.mask_bits(df[column].to_numpy(), len(column_labels))
+                rows = [bits[:, i] for i in range(len(column_labels))]
+            elif hasattr(df[column], 'cat'):
+                column_labels = [str(c) for c in df[column].cat.categories]
+                codes = df[column].cat.codes.to_numpy()
+                # 一次只展開一個值，避免 n_rows x 類別數 的暫存陣列
+                rows = (codes == i for i in range(len(column_labels)))
+            else:
+                continue
+            packed = [np.packbits(row, bitorder='little') for row in rows]
+            labels[column] = column_labels
+            bitmaps[column] = (np.stack(packed) if packed
+                               else np.zeros((0, (len(df) + 7) // 8), dtype=np.uint8))
+        return cls(len(df), labels, bitmaps, [column for column in labels if column in options])
+
+    def __contains__(self, column):
+        return column in self.bitmaps
+
+    @property
+    def nbytes(self):
+        return sum(bitmap.nbytes for bitmap in self.bitmaps.values())
+
+    def bitmap(self, column, value):
+        """Respondents with ``value`` in ``column``; empty if the value is unknown."""
+        position = self._positions[column].get(value)
+        if position is None:
+            return self._none
+        return self.bitmaps[column][position]
+
+    def any_of(self, column, values):
+        result = self._none
+        for value in values:
+            result = result | self.bitmap(column, value)
+        return result
+
+    def all_of(self, column, values):
+        result = self._all
+        for value in values:
+            result = result & self.bitmap(column, value)
+        return result
+
+    def select(self, where, multi='any'):
+        """AND of the per-column conditions in ``where`` ((column, values) pairs).
+
+        Values of one single-choice column are OR-ed; for multi-select columns
+        ``multi`` chooses between OR (``'any'``) and AND (``'all'``).
+        """
+        result = self._all
+        for column, values in where:
+            if multi == 'all' and column in self.multi:
+                result = result & self.all_of(column, values)
+            else:
+                result = result & self.any_of(column, values)
+        return result
+
+    def to_mask(self, bits):
+        """Unpack a bitmap into a boolean row mask."""
+        return np.unpackbits(bits, count=self.n_rows, bitorder='little').astype(bool)
@@ -0,0 +1,188 @@
+import functools
+import itertools
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+from utils import telemetry
+
+# 結果快取的記憶體上限，可用環境變數 SURVEY_RESULT_CACHE_MB 調整
+DEFAULT_MAX_BYTES = int(os.environ.get('SURVEY_RESULT_CACHE_MB', '256')) * 1024 * 1024
+
+
+def sizeof(value):
+    """Approximate the resident size of a cached result in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by the total size of its values."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            # 單一結果超過上限就不快取，避免把其他結果全部擠掉
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return value
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # 計算時不持有鎖，其他 session 可以同時讀取快取
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# 整個 process 共用一份結果快取
+result_cache = ResultCache()
+
+# 計算中的 key -> Future；同一個結果同時只算一次，其他呼叫等它算完
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+# id(DataFrame / Series) -> (weakref, 編號)；物件被回收後 id 可能被重用，所以用編號而不是 id 當 key
+_frame_tokens = {}
+_frame_lock = threading.Lock()
+_next_token = itertools.count(1)
+
+
+def _frame_token(value):
+    """A number identifying ``value`` for as long as it is alive (never reused)."""
+    key = id(value)
+    with _frame_lock:
+        entry = _frame_tokens.get(key)
+        if entry is None or entry[0]() is not value:
+            def forget(ref):
+                with _frame_lock:
+                    if _frame_tokens.get(key, (None,))[0] is ref:
+                        del _frame_tokens[key]
+            entry = _frame_tokens[key] = (weakref.ref(value, forget), next(_next_token))
+        return entry[1]
+
+
+def _param_key(value):
+    # DataFrame / Series 參數以物件本身（加上形狀）當 key：Client 傳入的資料集切片在整個
+    # process 裡是同一個物件，而同樣欄位、不同列的子集合會得到不同的 key
+    if isinstance(value, pd.DataFrame):
+        return ('frame', _frame_token(value), value.shape, tuple(value.columns))
+    if isinstance(value, pd.Series):
+        return ('series', _frame_token(value), value.shape, value.name)
+    return value
+
+
+def cached_result(method):
+    """Cache a Calculate method by (function, dataset version, parameters).
+
+    Results are shared between sessions, so callers must not mutate them.
+    Calculate instances without a dataset version are not cached. A call
+    for a result another thread is computing (e.g. a prefetch) waits for
+    it instead of computing it again. Every call is a telemetry span
+    tagged with its cache outcome.
+    """
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with telemetry.span(name) as span:
+            version = getattr(self, 'version', None)
+            if version is None:
+                value = method(self, *args, **kwargs)
+                cache = 'off'
+            else:
+                key = (
+                    name,
+                    version,
+                    tuple(_param_key(arg) for arg in args),
+                    tuple(sorted((k, _param_key(v)) for k, v in kwargs.items())),
+                )
+                missing = object()
+                value = result_cache.get(key, missing)
+                if value is missing:
+                    with _inflight_lock:
+                        pending = _inflight.get(key)
+                        owner = pending is None
+                        if owner:
+                            _inflight[key] = pending = Future()
+                    if owner:
+                        # 計算時不持有鎖，其他 session 可以同時讀取快取
+                        try:
+                            value = result_cache.put(key, method(self, *args, **kwargs))
+                        except BaseException as e:
+                            pending.set_exception(e)
+                            raise
+                        else:
+                            pending.set_result(value)
+                        finally:
+                            with _inflight_lock:
+                                del _inflight[key]
+                        cache = 'miss'
+                        telemetry.count('survey_cache_misses_total', function=name)
+                    else:
+                        value = pending.result()
+                        cache = 'wait'
+                        telemetry.count('survey_cache_waits_total', function=name)
+                else:
+                    cache = 'hit'
+                    telemetry.count('survey_cache_hits_total', function=name)
+            span.set(cache=cache)
+            if span.sampled and cache != 'hit':
+                span.add(bytes_allocated=sizeof(value))
+            return value
+    return wrapper
@@ -1,135 +1,362 @@
+import numpy as np
 import pandas as pd
-from functools import lru_cache
+from utils import schema, telemetry
+from utils.cache import cached_result
+
+# 區間的抽樣次數與信賴水準
+BOOTSTRAP_SAMPLES = 2000
+CONFIDENCE = 0.95
+
+
+def _codes(column):
+    """Return (integer codes, categories) of a column, -1 marking missing values."""
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype('category')
+    return column.cat.codes.to_numpy(), list(column.cat.categories)
+
+
+def _count_pairs(row_codes, n_rows, col_codes, n_cols):
+    """Cross-tabulate two code arrays into an (n_rows, n_cols) count matrix."""
+    valid = (row_codes >= 0) & (col_codes >= 0)
+    flat = row_codes[valid].astype(np.int64) * n_cols + col_codes[valid]
+    return np.bincount(flat, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+
+
+def _count_by_bits(codes, n_codes, bits):
+    """Count respondents per (code, option) into an (n_codes, n_options) matrix."""
+    valid = codes >= 0
+    counts = [np.bincount(codes[valid & bits[:, o]], minlength=n_codes) for o in range(bits.shape[1])]
+    return np.column_stack(counts) if counts else np.zeros((n_codes, 0), dtype=np.int64)
+
+
+def _share_interval(positive, answered, weights, n_boot, confidence, seed):
+    """Weighted share of ``positive`` among ``answered`` per stratum, with a Monte Carlo posterior interval.
+
+    ``positive`` has one row per stratum (and optionally one column per
+    category). Each stratum's share is drawn ``n_boot`` times from its
+    Jeffreys posterior ``Beta(k + 1/2, n - k + 1/2)`` (every stratum and
+    category in one ``rng.beta`` call), the draws are combined with
+    ``weights``, and the interval is the central ``confidence`` range of the
+    combined draws, widened to include the point estimate. A cell where all
+    or none of a few respondents answered positively thus still gets a wide
+    interval.
+    """
+    answered = answered.reshape((-1,) + (1,) * (positive.ndim - 1))
+    estimate = np.tensordot(weights, positive / answered, axes=1)
+    rng = np.random.default_rng(seed)
+    draws = rng.beta(positive + 0.5, answered - positive + 0.5, size=(n_boot,) + positive.shape)
+    replicates = np.tensordot(draws, weights, axes=([1], [0]))
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(replicates, [tail, 100 - tail], axis=0)
+    # 全部或沒有人回答某個答案時，區間延伸到 100% / 0%（Jeffreys 區間的邊界修正）
+    return estimate, np.minimum(low, estimate), np.maximum(high, estimate)
+
+
+def _sort_columns_by_total(cross_tab):
+    # 按總和排序列
+    column_sums = cross_tab.sum()
+    return cross_tab[column_sums.sort_values(ascending=False, kind='stable').index]
 
 
 class Calculate:
-    def __init__(self):
-        pass
-
-    @lru_cache(maxsize=32)
-    def calculate_percentage_of_AI_usage(self, AI_data_hash):
-        try:
-            print("Starting AI usage calculation...")
-            # Convert hash back to DataFrame with explicit column names
-            AI = pd.DataFrame(AI_data_hash, 
-                            columns=['ResponseId', 'AISelect', 'AISent', 'AIBen', 'AIToolCurrently Using'])
-            
-            print("AI DataFrame columns:", AI.columns.tolist())
-            print("AI DataFrame head:", AI.head())
-            print("AI DataFrame shape:", AI.shape)
-            
-            # 直接使用列名而不是位置索引
-            counts = AI['AISelect'].value_counts()
-            print("Value counts:", counts)
-            
-            total = counts.sum()
-            result = pd.DataFrame({
-                'AISelect': counts.index,
-                'count': counts.values,
-                'percentage': (counts.values / total)
-            })
-            
-            print("Final result:", result)
-            return result
-            
-        except Exception as e:
-            print(f"Error in calculate_percentage_of_AI_usage: {str(e)}")
-            print("Full error details:", e)
-            print("AI DataFrame info:")
-            print(AI.info())
-            print("AI DataFrame head:")
-            print(AI.head())
-            raise
+    def __init__(self, version=None, options=None, cube=None, rows=None):
+        # version 是資料集的指紋，作為結果快取的 key；None 表示不快取
+        self.version = version
+        # 多選題 bitmask 欄位 -> 選項清單
+        self.options = options or {}
+        # 預先計算的計數 cube，和它所計數的資料集的 index；
+        # 傳入的 DataFrame 是這份資料集的欄位切片（同一個 index 物件）時才從 cube 取值
+        self.cube = cube
+        self.rows = rows
+
+    def _from_cube(self, frames, *dims):
+        """Return (counts, labels per dim) from the count cube, or None to scan ``frames``.
+
+        The cube only answers when every frame is a column slice of the
+        dataset it counts (sharing its index) or ``None``, which stands for
+        that whole dataset (e.g. ``StreamingSurvey``, which holds no rows).
+        Any other frame, such as a filtered subset, is scanned.
+        """
+        if any(frame is not None and (self.rows is None or frame.index is not self.rows) for frame in frames):
+            return None
+        if self.cube is None or self.cube.find(dims) is None:
+            if any(frame is None for frame in frames):
+                raise ValueError(f"No count cube covers {list(dims)}; pass the DataFrames to scan instead")
+            return None
+        return self.cube.marginal(dims), [self.cube.labels[dim] for dim in dims]
+
+    def _bits(self, column):
+        """Return (options, boolean respondent x option matrix) of a multi-select column."""
+        if pd.api.types.is_integer_dtype(column.dtype):
+            options = self.options[column.name]
+            return options, schema.mask_bits(column.to_numpy(), len(options))
+        # 尚未編碼的分號字串（例如自行傳入的 DataFrame）
+        codes, combinations = _codes(column)
+        options, indicator = schema.split_multi_select(
+            combinations, schema.MULTI_SELECT.get(column.name, ())
+        )
+        bits = np.zeros((len(codes), len(options)), dtype=bool)
+        bits[codes >= 0] = indicator[codes[codes >= 0]].astype(bool)
+        return options, bits
 
+    def _require_categories(self, data, *columns, multi_select=False):
+        """Raise unless every column is in ``data`` and single-select categorical
+        (or, with ``multi_select``, a multi-select bitmask column)."""
+        for column in columns:
+            if column not in data.columns:
+                raise KeyError(f"Unknown column: {column!r}")
+            if column in self.options:
+                if not multi_select:
+                    raise ValueError(f"{column!r} is a multi-select column; expected a single-select one")
+            elif not isinstance(data[column].dtype, pd.CategoricalDtype):
+                raise ValueError(f"{column!r} is not a categorical column")
+
+    def _where_mask(self, data, where):
+        """Rows of ``data`` matching every ``(column, values)`` of ``where``."""
+        mask = np.ones(len(data), dtype=bool)
+        for column, values in where:
+            if column in self.options:
+                options, bits = self._bits(data[column])
+                selected = [options.index(v) for v in values if v in options]
+                mask &= bits[:, selected].any(axis=1)
+            else:
+                codes, categories = _codes(data[column])
+                mask &= np.isin(codes, [categories.index(v) for v in values if v in categories])
+        return mask
+
+    @cached_result
+    def calculate_poststratification_weights(self, data, column, stratify_by, where=()):
+        """Weight per ``stratify_by`` group making the respondents matching ``where``
+        look like all respondents who answered ``column``.
+
+        ``where`` is a tuple of ``(column, values)`` pairs. A respondent in
+        group ``h`` counts ``population share of h / sample share of h``
+        times; groups without any matching respondent are left out and the
+        population shares renormalized over the others.
+        """
+        self._require_categories(data, column, stratify_by)
+        self._require_categories(data, *(c for c, _ in where), multi_select=True)
+        telemetry.current().add(rows_scanned=len(data))
+        answered = _codes(data[column])[0] >= 0
+        strata, labels = _codes(data[stratify_by])
+        known = answered & (strata >= 0)
+        population = np.bincount(strata[known], minlength=len(labels))
+        sample = np.bincount(strata[known & self._where_mask(data, where)], minlength=len(labels))
+        present = sample > 0
+        target = population[present] / population[present].sum()
+        weights = target / (sample[present] / sample[present].sum())
+        return pd.Series(weights, index=pd.Index(np.asarray(labels, dtype=object)[present], name=stratify_by),
+                         name='weight')
+
+    def _answer_strata(self, data, column, where, stratify_by):
+        """Answer codes and categories of ``column``, the rows matching ``where``, and stratum codes."""
+        self._require_categories(data, column, *([] if stratify_by is None else [stratify_by]))
+        self._require_categories(data, *(c for c, _ in where), multi_select=True)
+        codes, categories = _codes(data[column])
+        selected = self._where_mask(data, where) & (codes >= 0)
+        if stratify_by is None:
+            strata, n_strata = np.zeros(len(data), dtype=np.int64), 1
+        else:
+            strata, labels = _codes(data[stratify_by])
+            n_strata = len(labels)
+            selected &= strata >= 0
+        return codes, categories, selected, strata, n_strata
+
+    def _stratum_weights(self, data, column, where, stratify_by, answered, present):
+        if stratify_by is None:
+            return np.ones(1)
+        weights = self.calculate_poststratification_weights(data, column, stratify_by, where).to_numpy()
+        # 權重乘上樣本比例 = 母體比例，加權後的比例是各組比例以母體比例加總
+        return weights * answered[present] / answered.sum()
+
+    @cached_result
+    def calculate_share_interval(self, data, column, positive, where=(), stratify_by=None,
+                                 n_boot=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE, seed=0):
+        """Percentage of respondents matching ``where`` whose ``column`` answer is in ``positive``.
+
+        ``where`` is a tuple of ``(column, values)`` pairs. Returns a Series
+        with the ``percentage``, the ``low`` / ``high`` bounds of its
+        ``confidence`` interval and the number of ``respondents`` it is based
+        on. With ``stratify_by`` (e.g. ``'Age'``) the answers are
+        post-stratified to the whole survey's mix of that column (see
+        ``calculate_poststratification_weights``) and the share of each
+        group is drawn separately. Seeded, so reruns give the same interval.
+        ``column`` and ``stratify_by`` must be single-select categorical
+        columns of ``data``: a missing one raises KeyError, any other ValueError.
+        """
+        codes, categories, selected, strata, n_strata = self._answer_strata(data, column, where, stratify_by)
+        telemetry.current().add(rows_scanned=len(data))
+        is_positive = np.isin(codes, [categories.index(v) for v in positive if v in categories])
+        answered = np.bincount(strata[selected], minlength=n_strata)
+        positives = np.bincount(strata[selected & is_positive], minlength=n_strata)
+        respondents = int(answered.sum())
+        if respondents == 0:
+            return pd.Series({'percentage': np.nan, 'low': np.nan, 'high': np.nan, 'respondents': 0}, dtype=object)
+
+        present = answered > 0
+        weights = self._stratum_weights(data, column, where, stratify_by, answered, present)
+        estimate, low, high = _share_interval(
+            positives[present], answered[present], weights, n_boot, confidence, seed
+        )
+        return pd.Series({
+            'percentage': float(estimate) * 100,
+            'low': float(low) * 100,
+            'high': float(high) * 100,
+            'respondents': respondents,
+        }, dtype=object)
+
+    @cached_result
+    def calculate_share_intervals(self, data, column, where=(), stratify_by=None,
+                                  n_boot=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE, seed=0):
+        """``calculate_share_interval`` for every answer of ``column`` at once.
+
+        Returns a DataFrame indexed by the answers given by the respondents
+        matching ``where``, with ``percentage``, ``low``, ``high`` and
+        ``respondents`` columns; all answers are drawn in one batch.
+        """
+        codes, categories, selected, strata, n_strata = self._answer_strata(data, column, where, stratify_by)
+        telemetry.current().add(rows_scanned=len(data))
+        counts = _count_pairs(strata[selected], n_strata, codes[selected], len(categories))
+        answered = counts.sum(axis=1)
+        respondents = int(answered.sum())
+        given = counts.sum(axis=0) > 0
+        index = pd.Index(np.asarray(categories, dtype=object)[given], name=column)
+        if respondents == 0:
+            return pd.DataFrame({
+                'percentage': pd.Series(dtype=float),
+                'low': pd.Series(dtype=float),
+                'high': pd.Series(dtype=float),
+                'respondents': pd.Series(dtype=np.int64),
+            }, index=index)
+
+        present = answered > 0
+        weights = self._stratum_weights(data, column, where, stratify_by, answered, present)
+        estimate, low, high = _share_interval(
+            counts[present][:, given], answered[present], weights, n_boot, confidence, seed
+        )
+        return pd.DataFrame({
+            'percentage': estimate * 100,
+            'low': low * 100,
+            'high': high * 100,
+            'respondents': np.int64(respondents),
+        }, index=index)
+
+    @cached_result
+    def calculate_percentage_of_AI_usage(self, AI):
+        # 優先使用 cube，否則直接在類別代碼上計數
+        cached = self._from_cube((AI,), 'AISelect')
+        if cached is not None:
+            counts, (categories,) = cached
+        else:
+            telemetry.current().add(rows_scanned=len(AI))
+            codes, categories = _codes(AI['AISelect'])
+            counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+        counts = pd.Series(counts, index=pd.Index(categories, name='AISelect'))
+        counts = counts[counts > 0].sort_values(ascending=False, kind='stable')
+        
+        total = counts.sum()
+        result = pd.DataFrame({
+            'AISelect': counts.index,
+            'count': counts.values,
+            'percentage': (counts.values / total)
+        })
+        return result
+
+    @cached_result
     def calculate_percentage_of_age(self, BI):
-        age_usage = BI.groupby('Age').count().iloc[:,0].rename('count').reset_index()
+        cached = self._from_cube((BI,), 'Age')
+        if cached is not None:
+            counts, (ages,) = cached
+        else:
+            telemetry.current().add(rows_scanned=len(BI))
+            codes, ages = _codes(BI['Age'])
+            counts = np.bincount(codes[codes >= 0], minlength=len(ages))
+        age_usage = pd.DataFrame({'Age': ages, 'count': counts})
+        age_usage = age_usage[age_usage['count'] > 0].reset_index(drop=True)
         age_usage['percentage'] = age_usage['count'] / age_usage['count'].sum()
         return age_usage
     
 
-    @lru_cache(maxsize=32)
-    def calculate_age_employment_distribution(self, BI_data_hash):
-        try:
-            print("Starting age employment distribution calculation...")
-            # Convert hash back to DataFrame with explicit column names - updated to include MainBranch
-            BI = pd.DataFrame(BI_data_hash, 
-                            columns=['ResponseId', 'Age', 'Employment', 'MainBranch'])
-            
-            print("BI DataFrame columns:", BI.columns.tolist())
-            print("BI DataFrame head:", BI.head())
-            print("BI DataFrame shape:", BI.shape)
+    @cached_result
+    def calculate_age_employment_distribution(self, BI):
+        cached = self._from_cube((BI,), 'Age', 'Employment')
+        if cached is not None:
+            counts, (ages, options) = cached
+        else:
+            telemetry.current().add(rows_scanned=len(BI))
+            # 缺值的代碼是 -1，交叉計數時會被排除
+            age, ages = _codes(BI['Age'])
             
-            # 預處理數據
-            mask = BI['Age'].notna() & BI['Employment'].notna()
-            BI = BI[mask].copy()
-            
-            # 使用 explode 處理多值
-            BI['Employment'] = BI['Employment'].str.split(';')
-            BI = BI.explode('Employment')
-            BI['Employment'] = BI['Employment'].str.strip()
+            # 就業狀態是 bitmask，每個選項各做一次 bincount，不需要 explode
+            options, employment = self._bits(BI['Employment'])
+            counts = _count_by_bits(age, len(ages), employment)
+        
+        cross_tab = pd.DataFrame(
+            counts,
+            index=pd.Index(ages, name='Age'),
+            columns=pd.Index(options, name='Employment'),
+        )
+        cross_tab = cross_tab.loc[cross_tab.sum(axis=1) > 0, cross_tab.sum() > 0]
+        cross_tab = cross_tab / cross_tab.values.sum() * 100
+        
+        return _sort_columns_by_total(cross_tab)
+    
+
+    @cached_result
+    def calculate_ai_usage_percentage(self, AI, BI):
+        cached = self._from_cube((AI, BI), 'Employment', 'Age', 'AISelect')
+        if cached is not None:
+            _, (options, ages, selections) = cached
+            # Keep respondents without an AISelect answer in the totals
+            counts = self.cube.marginal(['Employment', 'Age', 'AISelect'], dropna=False)
+            counts = counts[:, :len(ages)]
+            total_users = counts.sum(axis=2)
+            ai_users = (counts[:, :, selections.index('Yes')] if 'Yes' in selections
+                        else np.zeros_like(total_users))
+        else:
+            telemetry.current().add(rows_scanned=len(AI) + len(BI))
+            # Use merge instead of join to avoid column overlap
+            df = pd.merge(
+                AI[['ResponseId', 'AISelect']],
+                BI[['ResponseId', 'Employment', 'Age']],
+                on='ResponseId',
+                how='inner'
+            )
             
-            # 使用 crosstab 直接計算百分比
-            cross_tab = pd.crosstab(BI['Age'], BI['Employment'], normalize='all') * 100
+            # Employment is a bitmask: one boolean column per employment status
+            options, employment = self._bits(df['Employment'])
+            age, ages = _codes(df['Age'])
             
-            # 按總和排序列
-            column_sums = cross_tab.sum()
-            result = cross_tab[column_sums.sort_values(ascending=False).index]
+            # Convert AISelect to boolean for easier calculation
+            is_using_ai = (df['AISelect'] == 'Yes').to_numpy()
             
-            print("Final result shape:", result.shape)
-            print("Final result sample:", result.head())
-            return result
+            # First calculate total users for each employment-age combination
+            total_users = _count_by_bits(age, len(ages), employment).T
             
-        except Exception as e:
-            print(f"Error in calculate_age_employment_distribution: {str(e)}")
-            print("Full error details:", e)
-            if 'BI' in locals():
-                print("BI DataFrame info:")
-                print(BI.info())
-                print("BI DataFrame head:")
-                print(BI.head())
-            print("Original data hash sample:", BI_data_hash[:5])
-            raise
-    
-
-    def calculate_ai_usage_percentage(self, AI, BI):
-        # Use merge instead of join to avoid column overlap
-        df = pd.merge(
-            AI[['ResponseId', 'AISelect']],
-            BI[['ResponseId', 'Employment', 'Age']],
-            on='ResponseId',
-            how='inner'
-        )
-        
-        # Split employment statuses and explode to separate rows
-        df['Employment'] = df['Employment'].str.split(';')
-        df = df.explode('Employment')
-        df['Employment'] = df['Employment'].str.strip()
+            # Then calculate AI users for each employment-age combination
+            ai_users = _count_by_bits(np.where(is_using_ai, age, -1), len(ages), employment).T
         
-        # Convert AISelect to boolean for easier calculation
-        df['is_using_ai'] = df['AISelect'] == 'Yes'
-        
-        # First calculate total users for each employment-age combination
-        total_users = df.groupby(['Employment', 'Age']).size()
-        
-        # Then calculate AI users for each employment-age combination
-        ai_users = df[df['is_using_ai']].groupby(['Employment', 'Age']).size()
-        
-        # Calculate percentage
-        result = (ai_users / total_users * 100).round(2)
+        # Calculate percentage; groups without any AI user stay NaN
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentage = np.where(ai_users > 0, ai_users / total_users * 100, np.nan)
+        index = pd.MultiIndex.from_product([options, ages], names=['Employment', 'Age'])
+        result = pd.Series(percentage.ravel(), index=index)[total_users.ravel() > 0].round(2)
         
         # Sort values in descending order
         result = result.sort_values(ascending=False)
         
         return result
     
+    @cached_result
     def calculate_edu_brain_for_heatmap(self, EWC, BI):
-        try:
-            print("Starting edu brain heatmap calculation...")
-            
+        cached = self._from_cube((EWC, BI), 'EdLevel', 'MainBranch')
+        if cached is not None:
+            counts, (education_levels, branches) = cached
+        else:
             # 確保數據框不為空
             if EWC.empty or BI.empty:
                 raise ValueError("One or both DataFrames are empty")
-            
+            telemetry.current().add(rows_scanned=len(EWC) + len(BI))
             # 使用 MainBranch 替代 Employment
             eb = pd.merge(
                 BI[['ResponseId', 'MainBranch']],  # Changed from Employment to MainBranch
@@ -140,87 +367,70 @@ class Calculate:
             
             # MainBranch 已經是單一值，不需要 split 和 explode
             
-            # 創建交叉表並計算百分比
-            total_responses = len(eb['ResponseId'].unique())
-            cross_tab = pd.crosstab(
-                eb['EdLevel'], 
-                eb['MainBranch'],  # Changed from Employment to MainBranch
-                normalize='all'
-            ) * 100
-            
-            # 按列總和排序
-            column_sums = cross_tab.sum()
-            cross_tab = cross_tab[column_sums.sort_values(ascending=False).index]
-            
-            print("Cross tab shape:", cross_tab.shape)
-            print("Cross tab sample:", cross_tab.head())
-            
-            return cross_tab
-            
-        except Exception as e:
-            print(f"Error in calculate_edu_brain_for_heatmap: {str(e)}")
-            print("Full error details:", e)
-            print("EWC info:", EWC.info())
-            print("BI info:", BI.info())
-            raise
+            # 在類別代碼上建立交叉表
+            education, education_levels = _codes(eb['EdLevel'])
+            branch, branches = _codes(eb['MainBranch'])
+            counts = _count_pairs(education, len(education_levels), branch, len(branches))
+        
+        # 計算百分比
+        cross_tab = pd.DataFrame(
+            counts,
+            index=pd.Index(education_levels, name='EdLevel'),
+            columns=pd.Index(branches, name='MainBranch'),
+        )
+        cross_tab = cross_tab.loc[cross_tab.sum(axis=1) > 0, cross_tab.sum() > 0]
+        cross_tab = cross_tab / cross_tab.values.sum() * 100
+        
+        return _sort_columns_by_total(cross_tab)
     
-    @lru_cache(maxsize=32)
-    def calculate_favorable_on_edu_and_code(self, EWC_data_hash, BI_data_hash, AI_data_hash):
-        try:
-            print("Starting favorable calculation...")
-            # 轉換回 DataFrame，確保列名與數據匹配
-            EWC = pd.DataFrame(EWC_data_hash, 
-                             columns=['ResponseId', 'EdLevel'])
-            BI = pd.DataFrame(BI_data_hash, 
-                            columns=['ResponseId', 'Age', 'Employment', 'MainBranch'])  # 修正列名順序
-            AI = pd.DataFrame(AI_data_hash, 
-                            columns=['ResponseId', 'AISelect', 'AISent', 'AIBen', 'AIToolCurrently Using'])
-            
-            # Debug 輸出
-            print("BI DataFrame columns:", BI.columns.tolist())
-            print("BI DataFrame shape:", BI.shape)
-            print("BI data hash first row:", BI_data_hash[0] if BI_data_hash else None)
-            
-            # 使用更高效的合併方式
-            df = pd.merge(
-                BI[['ResponseId', 'MainBranch']],
-                EWC[['ResponseId', 'EdLevel']],
-                on='ResponseId'
-            )
-            result = pd.merge(
-                df,
-                AI[['ResponseId', 'AISent']],
-                on='ResponseId'
-            )
-            
-            print("Result columns:", result.columns.tolist())
-            print("Result shape:", result.shape)
-            
-            return result
-            
-        except Exception as e:
-            print(f"Error in calculate_favorable_on_edu_and_code: {str(e)}")
-            print("Full error details:", e)
-            print("BI_data_hash length:", len(BI_data_hash))
-            print("BI_data_hash first row:", BI_data_hash[0] if BI_data_hash else None)
-            raise
+    @cached_result
+    def calculate_favorable_on_edu_and_code(self, EWC, BI, AI):
+        telemetry.current().add(rows_scanned=len(BI) + len(EWC) + len(AI))
+        # 使用更高效的合併方式
+        df = pd.merge(
+            BI[['ResponseId', 'MainBranch']],
+            EWC[['ResponseId', 'EdLevel']],
+            on='ResponseId'
+        )
+        result = pd.merge(
+            df,
+            AI[['ResponseId', 'AISent']],
+            on='ResponseId'
+        )
+        return result
     
+    @cached_result
     def benefit_wordcloud(self, AI):
-        df = AI[['AIBen', 'AISent']].dropna()
-        # Split the benefits into separate items
-        df['AIBen'] = df['AIBen'].apply(lambda x: x.split(';'))
+        cached = self._from_cube((AI,), 'AISent', 'AIBen')
+        if cached is not None:
+            counts, (sentiments, options) = cached
+        else:
+            telemetry.current().add(rows_scanned=len(AI))
+            # AIBen is a bitmask: one boolean column per benefit
+            options, benefits = self._bits(AI['AIBen'])
+            sentiment, sentiments = _codes(AI['AISent'])
 
-        # Explode the list to separate rows and count frequencies
-        df = df.explode('AIBen')[['AIBen', 'AISent']]
-        benefit_counts = df.groupby(['AISent','AIBen']).size().reset_index(name='count')
+            # Count (sentiment, benefit) pairs with bit operations, no per-row explode
+            counts = _count_by_bits(sentiment, len(sentiments), benefits)
+        benefit_counts = pd.DataFrame(
+            counts,
+            index=pd.Index(sentiments, name='AISent'),
+            columns=pd.Index(options, name='AIBen'),
+        ).stack().reset_index(name='count')
+        benefit_counts = benefit_counts[benefit_counts['count'] > 0]
         benefit_counts = benefit_counts.sort_values(by='count', ascending=False)
 
         benefit_counts = benefit_counts[benefit_counts['AIBen'] != 'Other (please specify):']
         return benefit_counts
     
+    @cached_result
     def calculate_AI_tool_currently_using(self, AI):
-        df = AI[['AIToolCurrently Using', 'AISent']].dropna()
-        df['AIToolCurrently Using'] = df['AIToolCurrently Using'].apply(lambda x: x.split(';'))
-        df = df.explode('AIToolCurrently Using')
-        df['AIToolCurrently Using'] = df['AIToolCurrently Using'].str.strip()
-        return df
\ No newline at end of file
+        telemetry.current().add(rows_scanned=len(AI))
+        options, tools = self._bits(AI['AIToolCurrently Using'])
+        # One output row per (respondent, tool) with a known sentiment
+        tools &= AI['AISent'].notna().to_numpy()[:, None]
+        rows, tool = np.nonzero(tools)
+        return pd.DataFrame({
+            'AIToolCurrently Using': pd.Categorical.from_codes(tool, categories=options),
+            'AISent': AI['AISent'].array.take(rows),
+        }, index=AI.index[rows])
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""Plotly figure helpers shared by the pages.
+
+``highlight_bar`` builds a bar chart as one trace with per-bar colors, e.g.
+to highlight the user's own category, instead of one trace per bar.
+
+Figures that only depend on the dataset and the user's selection are built
+once and kept as finished JSON in the render cache (see
+``utils/render_cache.py``), keyed by (chart id, dataset version,
+selection). ``plotly_chart`` sends such JSON to the browser as is, so
+reruns skip building and validating Plotly objects altogether.
+"""
+import json
+
+import streamlit as st
+
+from utils.render_cache import render_cache
+
+# 直接送出 JSON 的捷徑用到 streamlit 內部模組，只在這個版本使用（requirements.txt 也固定這個版本）
+FAST_PATH_VERSION = '1.42.'
+
+
+def highlight_bar(labels, values, highlighted, color='#2a2a2a', highlight_color='#c5e1a5',
+                  orientation='v', value_format='.1f', suffix='%', **bar_kwargs):
+    """One ``go.Bar`` trace with the bars where ``highlighted`` is true in ``highlight_color``.
+
+    ``highlighted`` is a boolean mask aligned with ``labels``. Every bar is
+    labelled with its value (``value_format`` + ``suffix``); other keyword
+    arguments are passed on to ``go.Bar``.
+    """
+    # plotly 只在建立圖表時才載入，快取命中的重跑不需要
+    import numpy as np
+    import plotly.graph_objects as go
+
+    values = np.asarray(values)
+    colors = np.where(np.asarray(highlighted, dtype=bool), highlight_color, color)
+    # 數值軸：直條圖是 y，橫條圖是 x
+    if orientation == 'h':
+        x, y, value_axis = values, list(labels), 'x'
+    else:
+        x, y, value_axis = list(labels), values, 'y'
+    return go.Bar(
+        x=x,
+        y=y,
+        orientation=orientation,
+        marker_color=colors.tolist(),
+        texttemplate=f'%{{{value_axis}:{value_format}}}{suffix}',
+        **bar_kwargs,
+    )
+
+
+def figure_json(chart_id, version, selection, build):
+    """JSON of the figure returned by ``build()``, cached per dataset version and selection.
+
+    ``selection`` is a tuple of the plain values (strings, numbers, bools)
+    the figure depends on besides the data; ``()`` for figures that only
+    depend on the data.
+    """
+    def render():
+        import plotly.io as pio
+
+        return pio.to_json(build(), validate=False).encode()
+
+    key = ('figure', chart_id, version, tuple(selection))
+    return render_cache.get_or_render(key, render).decode()
+
+
+def plotly_chart(spec, use_container_width=True):
+    """``st.plotly_chart`` for a figure already serialized with ``figure_json``.
+
+    ``st.plotly_chart`` would rebuild and validate a Figure from a dict; this
+    sends the JSON as the chart spec directly, like ``st.plotly_chart`` does
+    for a figure without selections. That relies on Streamlit internals, so
+    it is only taken on the version it was written against
+    (``FAST_PATH_VERSION``); other versions, or internals that moved or
+    changed anyway, use the public API.
+    """
+    if not st.__version__.startswith(FAST_PATH_VERSION):
+        return st.plotly_chart(json.loads(spec), use_container_width=use_container_width)
+    try:
+        return _enqueue_spec(spec, use_container_width)
+    except (ImportError, AttributeError, TypeError):
+        # 其他 streamlit 版本（模組、屬性或參數改變）退回公開 API（會重新驗證圖表）
+        return st.plotly_chart(json.loads(spec), use_container_width=use_container_width)
+
+
+def _enqueue_spec(spec, use_container_width):
+    from streamlit.delta_generator_singletons import get_dg_singleton_instance
+    from streamlit.elements.lib.form_utils import current_form_id
+    from streamlit.elements.lib.utils import compute_and_register_element_id
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+
+    dg = get_dg_singleton_instance().main_dg
+    proto = PlotlyChartProto()
+    proto.use_container_width = use_container_width
+    proto.theme = 'streamlit'
+    proto.form_id = current_form_id(dg)
+    proto.spec = spec
+    proto.config = json.dumps({'showLink': False, 'linkText': False})
+    proto.id = compute_and_register_element_id(
+        'plotly_chart',
+        user_key=None,
+        form_id=proto.form_id,
+        plotly_spec=proto.spec,
+        plotly_config=proto.config,
+        selection_mode=('points', 'box', 'lasso'),
+        is_selection_activated=False,
+        theme='streamlit',
+        use_container_width=use_container_width,
+    )
+    return dg._enqueue('plotly_chart', proto)
@@ -1,104 +1,293 @@
 from utils.get_data import GetData
 from utils.calculate import Calculate
+from utils.partitions import DEFAULT_YEAR, available_years
+from utils.query import QueryEngine
+from utils import profiling, telemetry
 import pandas as pd
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 年度 -> 共用的 Client；只有被要求過的年度才會載入
+_shared_clients = {}
+_shared_client_lock = threading.Lock()
+
+# 預先計算下一頁資料的 worker 數，0 表示關閉
+PREFETCH_WORKERS = int(os.environ.get('SURVEY_PREFETCH_WORKERS', '2'))
+
+# 漏斗是線性的：看完每一頁（key）之後，下一頁一定會用到、和使用者選擇無關的資料
+# 第 4 頁沒有資料，所以第 3、4 頁都準備第 5 頁的
+NEXT_PAGE_DATA = {
+    'app': [('get_AI_usage', {})],
+    '1_home': [('get_age_employment_distribution', {})],
+    '2_knowmoreaboutyou': [('get_ai_usage_percentage', {})],
+    '3_doyouknow': [('get_edu_brain_for_heatmap', {})],
+    '4_relationshiptocode': [('get_edu_brain_for_heatmap', {})],
+    '5_selectrelationship': [('count', {'by': ['AISent']})],
+    '6_favorable': [('get_benefit_wordcloud', {})],
+    '7_knowmoreaboutidea': [('get_benefit_wordcloud', {})],
+}
+
+_prefetch_pool = None
+_prefetch_lock = threading.Lock()
+# 執行中的預先計算，同樣的呼叫不重複排入
+_prefetching = {}
+
+
+def _prefetch_executor():
+    global _prefetch_pool
+    with _prefetch_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix='survey-prefetch')
+        return _prefetch_pool
+
+
+def get_client(year=DEFAULT_YEAR):
+    """Return the process-wide Client of a survey year, building it on first use.
+
+    Streamlit runs every session in its own thread inside one server process,
+    so each year's dataset is loaded and preprocessed once and shared read-only.
+    """
+    client = _shared_clients.get(year)
+    if client is None:
+        with profiling.stage('fetch'), _shared_client_lock:
+            client = _shared_clients.get(year)
+            if client is None:
+                client = _shared_clients[year] = Client(year)
+    return client
+
+
+def loaded_years():
+    """Years whose data is currently resident in this process."""
+    return sorted(_shared_clients)
+
+
+def count_by_year(by=(), where=None, multi='any', years=None):
+    """Run the same ``Client.count`` query on several survey years.
+
+    Only the requested years are loaded. Returns the per-year results stacked
+    with a leading ``year`` column, e.g. for year-over-year AI adoption::
+
+        count_by_year(by=['AISelect'], years=[2023, 2024])
+    """
+    results = []
+    for year in years or available_years():
+        result = get_client(year).count(by, where, multi)
+        results.append(result.assign(year=year)[['year', *result.columns]])
+    if not results:
+        return pd.DataFrame(columns=['year', *by, 'count'])
+    return pd.concat(results, ignore_index=True)
+
+
+def _where_key(where):
+    # {欄位: 值或值的清單} -> 可以當快取 key 的 ((欄位, (值, ...)), ...)
+    return tuple(sorted(
+        (column, tuple(value) if isinstance(value, (list, tuple, set)) else (value,))
+        for column, value in (where or {}).items()
+    ))
 
 
 # Home Page
 class Client:
-    def __init__(self):
-        try:
+    def __init__(self, year=DEFAULT_YEAR):
+        with telemetry.span('Client.init', year=year):
             # 初始化時就讀取所有數據
-            print("Initializing Client...")
-            data_loader = GetData()
+            self.year = year
+            data_loader = GetData(year)
+            # 其他欄位群組（技術、Stack Overflow 使用）經由它延遲載入
+            self.data_loader = data_loader
+            # 資料集版本，頁面上繪圖結果的快取也用它當 key
+            self.version = data_loader.version
             
-            # 打印調試信息
-            print("Loading AI data...")
             self.AI = data_loader.get_AI()
-            print("AI columns:", self.AI.columns.tolist())
-            print("AI data sample:", self.AI.head())
-            
-            print("Loading BI data...")
             self.BI = data_loader.get_BI()
-            print("BI data loaded")
-            
-            print("Loading EWC data...")
             self.EWC = data_loader.get_EWC()
-            print("EWC data loaded")
+            
+            # 所有計算共用同一個 Calculate，結果依資料集版本快取
+            self.calculate = Calculate(
+                data_loader.version, data_loader.options, data_loader.cube, data_loader.data.index
+            )
+            # 頁面上的篩選與計數統一走 QueryEngine
+            self.query = QueryEngine(
+                data_loader.data, data_loader.options, data_loader.cube, data_loader.version,
+                data_loader.bitmaps
+            )
             
             # 預處理常用數據
             self._preprocess_data()
-            
-        except Exception as e:
-            print(f"Error in Client initialization: {str(e)}")
-            raise
+            self._frozen = True
+        
+    def __setattr__(self, name, value):
+        # Client 會被所有 session 共用，初始化完成後不允許再修改
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"Client is shared and read-only; cannot set {name!r}")
+        super().__setattr__(name, value)
         
     def _preprocess_data(self):
         """預處理常用數據以提高後續計算效率"""
-        try:
-            print("Starting data preprocessing...")
-            
-            # 檢查數據是否為空
-            if self.AI.empty:
-                raise ValueError("AI DataFrame is empty")
-                
-            # 檢查列是否存在
-            print("AI columns before preprocessing:", self.AI.columns.tolist())
-            
-            # 轉換數據為可哈希格式以用於緩存
-            self.AI_hash = tuple(map(tuple, self.AI.values))
-            self.BI_hash = tuple(map(tuple, self.BI.values))
-            self.EWC_hash = tuple(map(tuple, self.EWC.values))
-            
-            print("Data preprocessing completed successfully")
-            
-        except Exception as e:
-            print(f"Error in _preprocess_data: {str(e)}")
-            raise
+        # 檢查數據是否為空
+        if self.AI.empty:
+            raise ValueError("AI DataFrame is empty")
         
+    @telemetry.traced()
+    @profiling.staged('fetch')
+    def get_column_group(self, group):
+        """ResponseId and the columns of ``group``, e.g. ``'technology'`` for tech-stack pages.
+
+        Groups outside ``schema.CORE_GROUPS`` are read from the snapshot on
+        first use and then shared like the rest of the data.
+        """
+        return self.data_loader.get_group(group)
+
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_AI_usage(self):
-        try:
-            print("Calculating AI usage...")
-            print("AI columns available:", self.AI.columns.tolist())
-            print("AI data sample:", self.AI.head())
-            
-            result = Calculate().calculate_percentage_of_AI_usage(self.AI_hash)
-            print("AI usage calculation result:", result)
-            return result
-            
-        except Exception as e:
-            print(f"Error in get_AI_usage: {str(e)}")
-            raise
+        return self.calculate.calculate_percentage_of_AI_usage(self.AI)
     
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_age_usage(self):
-        age_usage = Calculate().calculate_percentage_of_age(self.BI)
+        age_usage = self.calculate.calculate_percentage_of_age(self.BI)
         return age_usage
     
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_employment_usage(self):
-        employment_usage = Calculate().calculate_percentage_of_employment(self.BI)
+        employment_usage = self.calculate.calculate_percentage_of_employment(self.BI)
         return employment_usage
 
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_age_employment_distribution(self):
-        return Calculate().calculate_age_employment_distribution(self.BI_hash)
+        return self.calculate.calculate_age_employment_distribution(self.BI)
     
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_ai_usage_percentage(self):
-        percentage = Calculate().calculate_ai_usage_percentage(self.AI, self.BI)
+        percentage = self.calculate.calculate_ai_usage_percentage(self.AI, self.BI)
         return percentage
     
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_edu_brain_for_heatmap(self):
-        heatmap_data = Calculate().calculate_edu_brain_for_heatmap(self.EWC, self.BI)
+        heatmap_data = self.calculate.calculate_edu_brain_for_heatmap(self.EWC, self.BI)
         return heatmap_data
     
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_favorable_on_edu_and_code(self):
-        return Calculate().calculate_favorable_on_edu_and_code(
-            self.EWC_hash, 
-            self.BI_hash, 
-            self.AI_hash
+        return self.calculate.calculate_favorable_on_edu_and_code(
+            self.EWC, 
+            self.BI, 
+            self.AI
         )
     
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_benefit_wordcloud(self):
-        benefit_wordcloud = Calculate().benefit_wordcloud(self.AI)
+        benefit_wordcloud = self.calculate.benefit_wordcloud(self.AI)
         return benefit_wordcloud
 
+    @telemetry.traced()
+    @profiling.staged('compute')
     def get_AI_tool_currently_using(self):
-        AI_tool_currently_using = Calculate().calculate_AI_tool_currently_using(self.AI)
-        return AI_tool_currently_using
\ No newline at end of file
+        AI_tool_currently_using = self.calculate.calculate_AI_tool_currently_using(self.AI)
+        return AI_tool_currently_using
+
+    @telemetry.traced()
+    @profiling.staged('compute')
+    def get_share_interval(self, column, positive, where=None, stratify_by=None):
+        """Percentage of the ``where`` respondents whose ``column`` answer is in ``positive``, with a 95% interval.
+
+        e.g. developers with one background who find AI favorable::
+
+            get_share_interval('AISent', ['Very favorable', 'Favorable'],
+                               where={'MainBranch': ..., 'EdLevel': ...}, stratify_by='Age')
+
+        See ``Calculate.calculate_share_interval``.
+        """
+        return self.calculate.calculate_share_interval(
+            self.data_loader.data, column, tuple(positive), _where_key(where), stratify_by
+        )
+
+    @telemetry.traced()
+    @profiling.staged('compute')
+    def get_share_intervals(self, column, where=None, stratify_by=None):
+        """Percentage of every answer of ``column`` among the ``where`` respondents, each with a 95% interval.
+
+        See ``Calculate.calculate_share_intervals``.
+        """
+        return self.calculate.calculate_share_intervals(
+            self.data_loader.data, column, _where_key(where), stratify_by
+        )
+
+    @telemetry.traced()
+    @profiling.staged('compute')
+    def get_poststratification_weights(self, column, stratify_by, where=None):
+        return self.calculate.calculate_poststratification_weights(
+            self.data_loader.data, column, stratify_by, _where_key(where)
+        )
+
+    @telemetry.traced()
+    @profiling.staged('compute')
+    def get_similar_respondents(self, profile, k=100, metric='jaccard'):
+        """The ``k`` respondents whose answers are most like ``profile``, with their AI sentiment and tools.
+
+        ``profile`` maps profile columns (Age, Employment, MainBranch,
+        EdLevel, AIToolCurrently Using, AIBen) to a value or a list of
+        values; only the given columns are compared. See
+        ``SimilarityIndex.similar``.
+        """
+        return self.data_loader.similarity_index().similar(_where_key(profile), k, metric)
+
+    def prefetch(self, name, **kwargs):
+        """Start ``self.<name>(**kwargs)`` on the prefetch pool and return its Future.
+
+        The result lands in the shared result cache, so the page that needs
+        it later gets a cache hit. A call that is already in flight is not
+        scheduled again; returns None when prefetching is off.
+        """
+        if PREFETCH_WORKERS <= 0:
+            return None
+        key = (self.year, name, repr(sorted(kwargs.items())))
+        executor = _prefetch_executor()
+        with _prefetch_lock:
+            future = _prefetching.get(key)
+            if future is not None:
+                telemetry.count('survey_prefetch_deduplicated_total', method=name)
+                return future
+            # 在同一段鎖內排入並登記，同時進來的 session 不會重複排入
+            future = _prefetching[key] = executor.submit(self._prefetch, name, kwargs)
+        telemetry.count('survey_prefetch_scheduled_total', method=name)
+
+        def forget(done):
+            with _prefetch_lock:
+                if _prefetching.get(key) is done:
+                    del _prefetching[key]
+        # 已經完成時 callback 會立刻在這個 thread 執行，所以不能持有鎖
+        future.add_done_callback(forget)
+        return future
+
+    def _prefetch(self, name, kwargs):
+        try:
+            getattr(self, name)(**kwargs)
+        except Exception:
+            # 頁面之後自己呼叫時會看到同樣的錯誤
+            telemetry.count('survey_prefetch_errors_total', method=name)
+            raise
+
+    def prefetch_next(self, page):
+        """Prefetch the data the page after ``page`` (e.g. ``'1_home'``) needs in the funnel."""
+        for name, kwargs in NEXT_PAGE_DATA.get(page, ()):
+            self.prefetch(name, **kwargs)
+
+    @telemetry.traced()
+    @profiling.staged('compute')
+    def count(self, by=(), where=None, multi='any'):
+        """Count respondents by ``by`` among those matching ``where``.
+
+        e.g. ``count(by=['AISent'], where={'MainBranch': ..., 'EdLevel': ...})``.
+        See ``QueryEngine.count`` for the full semantics.
+        """
+        return self.query.count(by, where, multi)
\ No newline at end of file
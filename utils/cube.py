@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from utils import schema, telemetry
+
+logger = logging.getLogger(__name__)
+
+# 每個 cube 的維度；頁面上所有圖表都是這些 cube 的邊際加總
+CUBES = {
+    'age_aiselect': ('Age', 'AISelect'),
+    'employment_age_aiselect': ('Employment', 'Age', 'AISelect'),
+    'branch_edlevel_aisent': ('MainBranch', 'EdLevel', 'AISent'),
+    'aisent_aiben': ('AISent', 'AIBen'),
+    'aisent_tool': ('AISent', 'AIToolCurrently Using'),
+}
+
+
+def build_counts(df, options, dims):
+    """Count respondents over ``dims`` in one pass of np.bincount.
+
+    Single-choice dimensions get one extra trailing slot for missing answers
+    so that summing a dimension out keeps every respondent. A multi-select
+    dimension counts a respondent once per picked option and has no missing
+    slot.
+    """
+    key = np.zeros(len(df), dtype=np.int64)
+    shape = []
+    multi = None
+    for dim in dims:
+        if dim in options:
+            multi = dim
+            continue
+        codes = df[dim].cat.codes.to_numpy().astype(np.int64)
+        size = len(df[dim].cat.categories) + 1
+        key = key * size + np.where(codes < 0, size - 1, codes)
+        shape.append(size)
+
+    length = int(np.prod(shape)) if shape else 1
+    if multi is None:
+        return np.bincount(key, minlength=length).reshape(shape)
+
+    bits = schema.mask_bits(df[multi].to_numpy(), len(options[multi]))
+    counts = np.stack([
+        np.bincount(key[bits[:, o]], minlength=length).reshape(shape)
+        for o in range(bits.shape[1])
+    ])
+    return np.moveaxis(counts, 0, dims.index(multi))
+
+
+def buildable_cubes(columns):
+    """Names of the ``CUBES`` whose dimensions are all among ``columns``."""
+    return [name for name, dims in CUBES.items() if all(dim in columns for dim in dims)]
+
+
+def _labels(df, options, dim):
+    if dim in options:
+        return list(options[dim])
+    return [str(c) for c in df[dim].cat.categories]
+
+
+class CountCube:
+    """Respondent counts over the dimension combinations the pages chart.
+
+    Built once per dataset version from the encoded snapshot frame and
+    persisted next to the snapshot; every chart is then a marginal of one
+    of the small arrays in ``CUBES``.
+    """
+
+    def __init__(self, version, labels, counts, multi):
+        self.version = version
+        # 維度 -> 類別 / 選項標籤（不含缺值）
+        self.labels = labels
+        # cube 名稱 -> numpy 計數陣列
+        self.counts = counts
+        # 多選題維度，不能被加總掉
+        self.multi = frozenset(multi)
+
+    @classmethod
+    def build(cls, df, options, version):
+        return cls.build_batches([df], options, version)
+
+    @classmethod
+    def build_batches(cls, batches, options, version):
+        """Build the cube from DataFrames holding consecutive rows of the dataset.
+
+        Each batch is counted and added to the running totals, so only one
+        batch needs to be in memory at a time. All batches must have the
+        same columns and categories, like the record batches of a snapshot.
+        """
+        counts = {}
+        labels = None
+        for df in batches:
+            if labels is None:
+                available = buildable_cubes(df.columns)
+                dims = {dim for name in available for dim in CUBES[name]}
+                labels = {dim: _labels(df, options, dim) for dim in dims}
+            elif any(_labels(df, options, dim) != dim_labels for dim, dim_labels in labels.items()):
+                raise ValueError("All batches must have the same categories")
+            for name in available:
+                batch_counts = build_counts(df, options, CUBES[name])
+                counts[name] = counts[name] + batch_counts if name in counts else batch_counts
+        if labels is None:
+            raise ValueError("Cannot build a count cube without any batch")
+        return cls(version, labels, counts, [dim for dim in labels if dim in options])
+
+    def save(self, path):
+        meta = {'version': self.version, 'labels': self.labels, 'multi': sorted(self.multi)}
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, __meta__=np.array(json.dumps(meta)), **self.counts)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['__meta__']))
+            counts = {name: data[name] for name in data.files if name != '__meta__'}
+        return cls(meta['version'], meta['labels'], counts, meta['multi'])
+
+    @classmethod
+    def load_or_build(cls, path, df, options, version):
+        """Load the persisted cube, rebuilding it if it belongs to another version."""
+        try:
+            cube = cls.load(path)
+            # 類別順序改變（例如快照格式更新）時標籤會不同，也要重建；
+            # 缺少某些欄位的年度只比對它建得出來的 cube
+            if (cube.version == version and set(cube.counts) == set(buildable_cubes(df.columns))
+                    and all(cube.labels[dim] == _labels(df, options, dim) for dim in cube.labels)):
+                return cube
+        except (OSError, ValueError, KeyError):
+            pass
+        cube = cls.build(df, options, version)
+        try:
+            cube.save(path)
+        except OSError as e:
+            # 唯讀的部署環境仍可使用記憶體中的 cube
+            logger.warning("Could not persist count cube %s: %s", path, e)
+            telemetry.count('survey_cube_persist_errors_total')
+        return cube
+
+    def find(self, dims):
+        """Return the name of the smallest cube covering ``dims``, or None."""
+        dims = set(dims)
+        candidates = [
+            name for name, cube_dims in CUBES.items()
+            if name in self.counts and dims <= set(cube_dims)
+            # 多選題維度不能被加總掉
+            and not (set(cube_dims) - dims) & self.multi
+        ]
+        return min(candidates, key=lambda name: self.counts[name].size, default=None)
+
+    def marginal(self, dims, dropna=True):
+        """Counts over ``dims`` (in that order) summed over the other dimensions.
+
+        With ``dropna`` the missing-answer slot of every single-choice
+        dimension is removed. Raises KeyError if no cube covers ``dims``.
+        """
+        dims = list(dims)
+        name = self.find(dims)
+        if name is None:
+            raise KeyError(f"No count cube covers {dims}")
+        cube_dims = list(CUBES[name])
+        summed = tuple(i for i, dim in enumerate(cube_dims) if dim not in dims)
+        counts = self.counts[name].sum(axis=summed) if summed else self.counts[name]
+        kept = [dim for dim in cube_dims if dim in dims]
+        counts = np.transpose(counts, [kept.index(dim) for dim in dims])
+        if dropna:
+            index = tuple(
+                slice(None) if dim in self.multi else slice(0, len(self.labels[dim]))
+                for dim in dims
+            )
+            counts = counts[index]
+        return counts
@@ -1,26 +1,47 @@
-import pandas as pd
-import zipfile
+import threading
 from functools import lru_cache
-import streamlit as st
+from utils import telemetry
+from utils.bitmap import BitmapIndex
+from utils.cache import sizeof
+from utils.cube import CountCube
+from utils.partitions import DEFAULT_YEAR, snapshot_file, source_zip
+from utils.schema import COLUMN_ALIASES, CORE_GROUPS, group_columns
+from utils.similarity import SimilarityIndex
+from utils.snapshot import cube_path, ensure_snapshot, load_snapshot, snapshot_hash, snapshot_options
 
 class GetData:
-    def __init__(self):
-        @st.cache_data
-        def load_data():
-            with zipfile.ZipFile('survey_results_public.csv.zip', 'r') as zip_ref:
-                # 假设 ZIP 文件中只有一个 CSV 文件
-                csv_filename = zip_ref.namelist()[0]
-                with zip_ref.open(csv_filename) as f:
-                    return pd.read_csv(
-                        f,
-                        usecols=lambda x: x in [
-                            'ResponseId', 'Age', 'Employment', 'MainBranch',
-                            'EdLevel', 'AISelect', 'AISent', 'AIBen',
-                            'AIToolCurrently Using'
-                        ]
-                    )
-        
-        self.data = load_data()
+    def __init__(self, year=DEFAULT_YEAR):
+        with telemetry.span('GetData.load', year=year):
+            # 每個年度是一個獨立的分區（zip + 快照 + cube），只在被要求時才載入
+            self.year = year
+            # 第一次啟動時把 zip 轉成 Arrow 快照，之後直接 memory-map 快照
+            # GetData 由 get_client() 在每個 process 只建立一次，不需要再經過 st.cache_data
+            with telemetry.span('GetData.snapshot'):
+                snapshot_path = ensure_snapshot(
+                    source_zip(year), snapshot_file(year), COLUMN_ALIASES.get(year)
+                )
+            # 資料集版本 = 原始 zip 的 sha256，用於結果快取的 key
+            self.version = snapshot_hash(snapshot_path)
+            # 多選題欄位是 bitmask，這裡記錄每個 bit 對應的選項
+            self.options = snapshot_options(snapshot_path)
+            # 其他欄位群組在第一次被要求時才讀（get_group）
+            self.snapshot_path = snapshot_path
+            self._groups = {}
+            self._groups_lock = threading.Lock()
+            self._similarity = None
+            with telemetry.span('GetData.read') as span:
+                self.data = load_snapshot(snapshot_path, group_columns(*CORE_GROUPS))
+                if span.sampled:
+                    span.set(rows=len(self.data), bytes_allocated=sizeof(self.data))
+            # 圖表用的計數 cube，和快照放在一起，版本不同時重建
+            with telemetry.span('GetData.cube'):
+                self.cube = CountCube.load_or_build(
+                    cube_path(snapshot_path), self.data, self.options, self.version
+                )
+            # 每個 (欄位, 值) 一個 bitmap，多條件篩選只需要 AND/OR 和 popcount
+            with telemetry.span('GetData.bitmaps') as span:
+                self.bitmaps = BitmapIndex.build(self.data, self.options)
+                span.add(rows_scanned=len(self.data), bytes_allocated=self.bitmaps.nbytes)
         
     @lru_cache(maxsize=1)
     def get_BI(self):
@@ -35,10 +56,37 @@ class GetData:
         return self.data[['ResponseId', 'AISelect', 'AISent', 
                          'AIBen', 'AIToolCurrently Using']]
 
+    def get_group(self, group):
+        """ResponseId and the columns of ``group`` (see ``schema.COLUMN_GROUPS``).
+
+        Core groups are sliced from ``self.data``; any other group is read
+        from the snapshot the first time it is requested and kept.
+        """
+        columns = group_columns(group)
+        if group in CORE_GROUPS:
+            return self.data[[column for column in columns if column in self.data.columns]]
+        with self._groups_lock:
+            if group not in self._groups:
+                with telemetry.span('GetData.read_group', group=group) as span:
+                    self._groups[group] = load_snapshot(self.snapshot_path, columns)
+                    if span.sampled:
+                        span.set(bytes_allocated=sizeof(self._groups[group]))
+            return self._groups[group]
+
+    def similarity_index(self):
+        """The nearest-respondent index over the core columns, built on first use."""
+        with self._groups_lock:
+            if self._similarity is None:
+                with telemetry.span('GetData.similarity') as span:
+                    # 總結頁以漏斗中問過的四個問題比較
+                    self._similarity = SimilarityIndex.build(self.data, self.options, self.version).prepare(
+                        ['Age', 'Employment', 'MainBranch', 'EdLevel']
+                    )
+                    span.add(rows_scanned=len(self.data), bytes_allocated=self._similarity.nbytes)
+            return self._similarity
+
     def get_TTC(self):
-        TTC = pd.concat([self.data.iloc[:, 0],  self.data.iloc[:,22:56]], axis=1)
-        return TTC
+        return self.get_group('technology')
 
     def get_SOUC(self):
-        SOUC = pd.concat([self.data.iloc[:, 0],  self.data.iloc[:,56:63]], axis=1)
-        return SOUC
\ No newline at end of file
+        return self.get_group('so_usage')
\ No newline at end of file
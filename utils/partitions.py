@@ -0,0 +1,37 @@
+import glob
+import os
+import re
+
+from utils.snapshot import SNAPSHOT_FILE, SOURCE_ZIP
+
+# 目前頁面使用的年度
+DEFAULT_YEAR = 2024
+
+# 年度 -> 原始 zip；2024 沿用專案根目錄原本的檔名，其他年度為
+# survey_results_public_<year>.csv.zip，放進專案根目錄即可使用
+SOURCES = {
+    DEFAULT_YEAR: SOURCE_ZIP,
+}
+SNAPSHOTS = {
+    DEFAULT_YEAR: SNAPSHOT_FILE,
+}
+
+_YEAR_FILE = re.compile(r'survey_results_public_(\d{4})\.(csv\.zip|arrow)$')
+
+
+def source_zip(year):
+    return SOURCES.get(year, f'survey_results_public_{year}.csv.zip')
+
+
+def snapshot_file(year):
+    return SNAPSHOTS.get(year, f'survey_results_public_{year}.arrow')
+
+
+def available_years():
+    """Years whose source zip or snapshot is present, oldest first."""
+    years = {year for year in SOURCES if os.path.exists(source_zip(year)) or os.path.exists(snapshot_file(year))}
+    for path in glob.glob('survey_results_public_*'):
+        match = _YEAR_FILE.search(os.path.basename(path))
+        if match:
+            years.add(int(match.group(1)))
+    return sorted(years)
@@ -0,0 +1,198 @@
+"""Per-rerun profiling of the pages.
+
+Off by default. Turn it on for the whole server with ``SURVEY_PROFILE=1``
+or for one browser session by opening any page with ``?profile=1`` (it
+stays on for that session while navigating). Every rerun of a profiled
+page then
+
+- times its ``main()`` split into stages: ``fetch`` (getting the dataset,
+  ``get_client``), ``compute`` (``Client`` queries), ``figure`` (building
+  Plotly figures / rendering images) and ``serialize`` (handing the figure
+  to Streamlit, which serializes it); the rest is ``other``,
+- shows the breakdown in a collapsed "Profile" panel at the bottom,
+- writes ``<page>-<time>.pstats`` (function level, for ``python -m pstats``
+  or snakeviz) and ``<page>-<time>.speedscope.json`` (stage timeline, for
+  https://www.speedscope.app) to ``SURVEY_PROFILE_DIR`` (default
+  ``profiles``).
+
+Stage times are exclusive: a ``compute`` call made while building a figure
+counts as ``compute`` only.
+"""
+import cProfile
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+STAGES = ('fetch', 'compute', 'figure', 'serialize')
+
+_local = threading.local()
+
+
+class PageProfile:
+    """Stage timings of one page rerun."""
+
+    def __init__(self, page):
+        self.page = page
+        self.totals = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+        # speedscope 的事件：(O/C, 階段, 相對時間)
+        self.events = []
+        self.stack = []
+        self.start = time.perf_counter()
+        self.wall = None
+        self._resumed = self.start
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self.stack:
+            self.totals[self.stack[-1]] += now - self._resumed
+        self.stack.append(name)
+        self.calls[name] += 1
+        self.events.append(('O', name, now - self.start))
+        self._resumed = now
+
+    def exit(self):
+        now = time.perf_counter()
+        name = self.stack.pop()
+        self.totals[name] += now - self._resumed
+        self.events.append(('C', name, now - self.start))
+        self._resumed = now
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.start
+
+    def breakdown(self):
+        """Rows of (stage, seconds, calls), ending with ``other`` and ``total``."""
+        rows = [(name, self.totals[name], self.calls[name]) for name in STAGES]
+        rows.append(('other', max(self.wall - sum(self.totals.values()), 0.0), None))
+        rows.append(('total', self.wall, None))
+        return rows
+
+    def speedscope(self):
+        """The stage timeline in speedscope's evented-profile format."""
+        frames = ['main', *STAGES]
+        events = [{'type': 'O', 'frame': 0, 'at': 0.0}]
+        events += [{'type': kind, 'frame': frames.index(name), 'at': at * 1000} for kind, name, at in self.events]
+        events.append({'type': 'C', 'frame': 0, 'at': self.wall * 1000})
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': self.page,
+            'exporter': 'survey profiling',
+            'shared': {'frames': [{'name': name} for name in frames]},
+            'profiles': [{
+                'type': 'evented',
+                'name': self.page,
+                'unit': 'milliseconds',
+                'startValue': 0.0,
+                'endValue': self.wall * 1000,
+                'events': events,
+            }],
+        }
+
+
+def current():
+    """The profile of the rerun running in this thread, or None."""
+    return getattr(_local, 'profile', None)
+
+
+@contextlib.contextmanager
+def _timed(profile, name):
+    profile.enter(name)
+    try:
+        yield
+    finally:
+        profile.exit()
+
+
+def stage(name):
+    """Context manager attributing a block to ``name`` (no-op outside a profiled rerun)."""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return contextlib.nullcontext()
+    return _timed(profile, name)
+
+
+def staged(name):
+    """Decorator attributing every call of a function to stage ``name``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, 'profile', None) is None:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def requested():
+    """Whether this rerun should be profiled (environment or ``?profile=1``)."""
+    import streamlit as st
+
+    if os.environ.get('SURVEY_PROFILE', '0') not in ('', '0'):
+        return True
+    flag = st.query_params.get('profile')
+    if flag is not None:
+        st.session_state['_profile'] = flag not in ('', '0', 'false')
+    return st.session_state.get('_profile', False)
+
+
+def _dump(profile, profiler):
+    directory = os.environ.get('SURVEY_PROFILE_DIR', 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"{profile.page}-{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns() % 10**6:06d}")
+    paths = []
+    if profiler is not None:
+        profiler.dump_stats(base + '.pstats')
+        paths.append(base + '.pstats')
+    with open(base + '.speedscope.json', 'w') as f:
+        json.dump(profile.speedscope(), f)
+    paths.append(base + '.speedscope.json')
+    return paths
+
+
+def _show(profile, paths):
+    import pandas as pd
+    import streamlit as st
+
+    rows = profile.breakdown()
+    table = pd.DataFrame({
+        'stage': [name for name, _, _ in rows],
+        'ms': [round(seconds * 1000, 1) for _, seconds, _ in rows],
+        'share': [f'{seconds / profile.wall:.0%}' if profile.wall else '-' for _, seconds, _ in rows],
+        'calls': pd.array([calls for _, _, calls in rows], dtype='Int64'),
+    })
+    with st.expander(f"⏱ Profile: {profile.wall * 1000:.0f} ms", expanded=False):
+        st.dataframe(table, hide_index=True, use_container_width=True)
+        st.caption('Saved ' + ', '.join(f'`{path}`' for path in paths))
+
+
+def run_page(main):
+    """Run a page's ``main()``, profiling it when requested."""
+    if not requested():
+        return main()
+    page = os.path.splitext(os.path.basename(main.__code__.co_filename))[0]
+    profile = PageProfile(page)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同一時間只能有一個 cProfile 在執行（例如另一個 session 也在 profile）
+        profiler = None
+    _local.profile = profile
+    completed = False
+    try:
+        main()
+        completed = True
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _local.profile = None
+        profile.finish()
+        paths = _dump(profile, profiler)
+    # switch_page / rerun 會以例外離開 main()，那時頁面已經不會顯示
+    if completed:
+        _show(profile, paths)
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+from utils import schema, telemetry
+from utils.bitmap import popcount
+from utils.cache import cached_result
+from utils.cube import build_counts
+
+# 分組數超過這個值時，逐組 AND + popcount 不如直接掃描欄位
+MAX_BITMAP_GROUPS = 256
+
+
+def _as_values(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(value)
+    return (value,)
+
+
+def tidy(counts, dims, labels):
+    """Turn a dense count array over ``dims`` into a long DataFrame."""
+    if not dims:
+        return pd.DataFrame({'count': [int(counts)]})
+    positions = np.nonzero(counts)
+    result = pd.DataFrame({
+        dim: np.asarray(labels[i], dtype=object)[positions[i]]
+        for i, dim in enumerate(dims)
+    })
+    result['count'] = counts[positions].astype(np.int64)
+    # 和 value_counts 一樣依數量由大到小排序
+    return result.sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+
+
+class QueryEngine:
+    """Filter-and-count queries over the survey respondents.
+
+    Each query is planned against the fastest structure that can answer it:
+    the precomputed count cube when it covers the requested dimensions, then
+    the per-value bitmap index, otherwise a scan of the encoded columns.
+    """
+
+    def __init__(self, data, options, cube=None, version=None, bitmaps=None):
+        self.data = data
+        self.options = options
+        self.cube = cube
+        self.bitmaps = bitmaps
+        # 有 version 時查詢結果放進共用的結果快取
+        self.version = version
+
+    def count(self, by=(), where=None, multi='any'):
+        """Count respondents grouped by ``by`` among those matching ``where``.
+
+        ``where`` maps a column to a value or a list of accepted values. For
+        multi-select columns ``multi`` decides whether a respondent must have
+        picked ``'any'`` or ``'all'`` of the listed options. Grouping by a
+        multi-select column counts a respondent once per picked option.
+        Missing answers are left out of the groups.
+
+        Returns a DataFrame with one column per ``by`` entry plus ``count``,
+        sorted by count. The result is shared and must not be modified.
+        """
+        by, where = self._normalize(by, where, multi)
+        return self._count(by, where, multi)
+
+    def count_array(self, by=(), where=None, multi='any'):
+        """Dense counts of ``count(by, where, multi)`` and the labels of each ``by`` column.
+
+        Always scans the columns. The arrays of engines over the batches of
+        one dataset can be added up and passed to ``tidy`` to get the same
+        result as ``count`` over the whole dataset.
+        """
+        by, where = self._normalize(by, where, multi)
+        return self._column_counts(by, where, multi), [self._labels(column) for column in by]
+
+    def _normalize(self, by, where, multi):
+        if multi not in ('any', 'all'):
+            raise ValueError(f"multi must be 'any' or 'all', got {multi!r}")
+        by = tuple(by)
+        where = tuple(sorted((column, _as_values(value)) for column, value in (where or {}).items()))
+        for column in by + tuple(column for column, _ in where):
+            if column not in self.data.columns:
+                raise KeyError(f"Unknown column: {column!r}")
+            # 只能用類別欄位或多選題 bitmask 欄位分組 / 篩選（例如 ResponseId 不行）
+            if column not in self.options and not isinstance(self.data[column].dtype, pd.CategoricalDtype):
+                raise ValueError(f"Cannot group or filter by {column!r}: not a categorical or multi-select column")
+        if sum(column in self.options for column in by) > 1:
+            raise ValueError("Can only group by one multi-select column at a time")
+        return by, where
+
+    def plan(self, by=(), where=None, multi='any'):
+        """Name the structure a query would be answered from."""
+        where = tuple((column, _as_values(value)) for column, value in (where or {}).items())
+        return self._plan(tuple(by), where)
+
+    def _plan(self, by, where):
+        if self._cube_dims(by, where) is not None:
+            return 'cube'
+        if self._use_bitmaps(by, where):
+            return 'bitmap'
+        return 'columns'
+
+    @cached_result
+    def _count(self, by, where, multi):
+        plan = self._plan(by, where)
+        telemetry.current().set(plan=plan)
+        if plan == 'cube':
+            return self._count_from_cube(by, where)
+        if plan == 'bitmap':
+            return self._count_from_bitmaps(by, where, multi)
+        return self._count_from_columns(by, where, multi)
+
+    def _labels(self, column):
+        if column in self.options:
+            return list(self.options[column])
+        return [str(c) for c in self.data[column].cat.categories]
+
+    def _cube_dims(self, by, where):
+        if self.cube is None:
+            return None
+        for column, values in where:
+            # 多選題的條件只能在不分組、只有一個選項時從 cube 切出來
+            if column in self.options and (column in by or len(values) != 1):
+                return None
+        dims = list(by) + [column for column, _ in where if column not in by]
+        if self.cube.find(dims) is None:
+            return None
+        return dims
+
+    def _count_from_cube(self, by, where):
+        dims = self._cube_dims(by, where)
+        counts = self.cube.marginal(dims, dropna=False)
+        labels = [self.cube.labels[dim] for dim in dims]
+        conditions = dict(where)
+        index = []
+        for dim, dim_labels in zip(dims, labels):
+            if dim in conditions:
+                selected = [dim_labels.index(v) for v in conditions[dim] if v in dim_labels]
+            else:
+                # 不包含單選題最後的缺值欄位
+                selected = list(range(len(dim_labels)))
+            index.append(np.asarray(selected, dtype=np.int64))
+        counts = counts[np.ix_(*index)] if index else counts
+        # 條件欄位不在分組裡的要加總掉
+        summed = tuple(i for i, dim in enumerate(dims) if dim not in by)
+        if summed:
+            counts = counts.sum(axis=summed)
+        kept = [i for i, dim in enumerate(dims) if dim in by]
+        by_labels = [[labels[i][j] for j in index[i]] for i in kept]
+        return tidy(counts, list(by), by_labels)
+
+    def _use_bitmaps(self, by, where):
+        if self.bitmaps is None:
+            return False
+        columns = list(by) + [column for column, _ in where]
+        if not all(column in self.bitmaps for column in columns):
+            return False
+        return int(np.prod([len(self.bitmaps.labels[column]) for column in by])) <= MAX_BITMAP_GROUPS
+
+    def _count_from_bitmaps(self, by, where, multi):
+        telemetry.current().add(rows_scanned=self.bitmaps.n_rows)
+        selected = self.bitmaps.select(where, multi)
+        labels = [self.bitmaps.labels[column] for column in by]
+        counts = np.zeros([len(column_labels) for column_labels in labels], dtype=np.int64)
+
+        def fill(bits, depth, index):
+            if depth == len(by):
+                counts[index] = popcount(bits)
+                return
+            for i, label in enumerate(labels[depth]):
+                fill(bits & self.bitmaps.bitmap(by[depth], label), depth + 1, index + (i,))
+
+        fill(selected, 0, ())
+        return tidy(counts if by else counts[()], list(by), labels)
+
+    def _row_mask(self, where, multi):
+        mask = np.ones(len(self.data), dtype=bool)
+        for column, values in where:
+            labels = self._labels(column)
+            selected = [labels.index(v) for v in values if v in labels]
+            if column in self.options:
+                bits = schema.mask_bits(self.data[column].to_numpy(), len(labels))[:, selected]
+                if multi == 'all':
+                    # 有未知選項時沒有人能全部符合
+                    matched = bits.all(axis=1) if len(selected) == len(values) else np.zeros(len(bits), dtype=bool)
+                else:
+                    matched = bits.any(axis=1)
+            else:
+                matched = np.isin(self.data[column].cat.codes.to_numpy(), selected)
+            mask &= matched
+        return mask
+
+    def _column_counts(self, by, where, multi):
+        telemetry.current().add(rows_scanned=len(self.data))
+        mask = self._row_mask(where, multi)
+        if not by:
+            return np.int64(mask.sum())
+        counts = build_counts(self.data.loc[mask, list(by)], self.options, by)
+        # 去掉單選題的缺值欄位
+        index = tuple(
+            slice(None) if column in self.options else slice(0, len(self._labels(column)))
+            for column in by
+        )
+        return counts[index]
+
+    def _count_from_columns(self, by, where, multi):
+        counts = self._column_counts(by, where, multi)
+        return tidy(counts, list(by), [self._labels(column) for column in by])
@@ -0,0 +1,156 @@
+"""Cache of rendered page output such as images.
+
+Rendered output only depends on the dataset version, a few parameters and
+the code that draws it (a hash of the app's sources is part of every key),
+so it is shared by all sessions: a byte-bounded in-memory LRU
+(``ResultCache``) in front of a byte-bounded directory that survives
+restarts and is shared between server processes. Configured with
+
+``SURVEY_RENDER_CACHE_MB``
+    Memory limit in MB (default 32).
+``SURVEY_RENDER_CACHE_DIR``
+    Directory of the on-disk tier (default ``.render_cache``; empty
+    disables it).
+``SURVEY_RENDER_CACHE_DISK_MB``
+    Disk limit in MB (default 256); the least recently used files are
+    removed first.
+"""
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+
+from utils import telemetry
+from utils.cache import ResultCache
+
+DEFAULT_MAX_BYTES = int(os.environ.get('SURVEY_RENDER_CACHE_MB', '32')) * 1024 * 1024
+DEFAULT_DIR = os.environ.get('SURVEY_RENDER_CACHE_DIR', '.render_cache')
+DEFAULT_DISK_BYTES = int(os.environ.get('SURVEY_RENDER_CACHE_DISK_MB', '256')) * 1024 * 1024
+
+
+def _code_version():
+    """Hash of the app's Python sources; output drawn by other code is never served."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha256()
+    for pattern in ('app.py', 'pages/*.py', 'utils/*.py'):
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+CODE_VERSION = _code_version()
+
+
+class DiskCache:
+    """Directory of byte strings keyed by a hash of the cache key, bounded in size."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(repr(key).encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # 以修改時間當作最近使用時間，淘汰時依此排序
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # 另一個 process 剛好刪掉了
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.is_file():
+                    os.remove(entry.path)
+
+
+class RenderCache:
+    """Two-level cache of rendered bytes: memory first, then disk."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=DEFAULT_DIR, disk_bytes=DEFAULT_DISK_BYTES):
+        self.memory = ResultCache(max_bytes)
+        self.disk = DiskCache(directory, disk_bytes) if directory else None
+
+    def get_or_render(self, key, render):
+        """Return the bytes cached under ``key``, calling ``render()`` on a miss.
+
+        ``key`` must identify the output completely (kind, dataset version
+        and parameters) and be made of plain values, since its ``repr`` names
+        the file on disk.
+        """
+        kind = key[0]
+        key = (*key, CODE_VERSION)
+        data = self.memory.get(key)
+        if data is not None:
+            telemetry.count('survey_render_cache_hits_total', kind=kind, tier='memory')
+            return data
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                telemetry.count('survey_render_cache_hits_total', kind=kind, tier='disk')
+                return self.memory.put(key, data)
+        telemetry.count('survey_render_cache_misses_total', kind=kind)
+        data = render()
+        if self.disk is not None:
+            try:
+                self.disk.put(key, data)
+            except OSError:
+                # 磁碟寫不進去（唯讀、空間不足）時只用記憶體快取
+                pass
+        return self.memory.put(key, data)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+# 整個 process 共用一份
+render_cache = RenderCache()
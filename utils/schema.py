@@ -0,0 +1,242 @@
+"""Category order for the survey dimensions.
+
+Every low-cardinality survey column is loaded as a pandas categorical whose
+categories follow the order below (the order the answers appear in the
+2024 questionnaire, see ``2024 Developer Survey.pdf``). Answers that are not
+listed here are appended after the documented ones in sorted order, so the
+integer codes of the documented answers never change between loads.
+
+Multi-select questions (answers joined with ';') are stored as one integer
+bitmask per respondent instead; bit ``i`` stands for the ``i``-th option in
+the same documented-then-sorted order.
+"""
+import numpy as np
+import pandas as pd
+
+AGE = [
+    'Under 18 years old',
+    '18-24 years old',
+    '25-34 years old',
+    '35-44 years old',
+    '45-54 years old',
+    '55-64 years old',
+    '65 years or older',
+    'Prefer not to say',
+]
+
+MAIN_BRANCH = [
+    'I am a developer by profession',
+    'I am not primarily a developer, but I write code sometimes as part of my work/studies',
+    'I used to be a developer by profession, but no longer am',
+    'I am learning to code',
+    'I code primarily as a hobby',
+    'None of these',
+]
+
+ED_LEVEL = [
+    'Primary/elementary school',
+    'Secondary school (e.g. American high school, German Realschule or Gymnasium, etc.)',
+    'Some college/university study without earning a degree',
+    'Associate degree (A.A., A.S., etc.)',
+    'Bachelor’s degree (B.A., B.S., B.Eng., etc.)',
+    'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)',
+    'Professional degree (JD, MD, Ph.D, Ed.D, etc.)',
+    'Something else',
+]
+
+AI_SELECT = [
+    'Yes',
+    'No, but I plan to soon',
+    "No, and I don't plan to",
+]
+
+AI_SENT = [
+    'Very favorable',
+    'Favorable',
+    'Indifferent',
+    'Unsure',
+    'Unfavorable',
+    'Very unfavorable',
+]
+
+# 多選題的選項，原始資料以分號串接
+EMPLOYMENT = [
+    'Employed, full-time',
+    'Employed, part-time',
+    'Independent contractor, freelancer, or self-employed',
+    'Student, full-time',
+    'Student, part-time',
+    'Not employed, but looking for work',
+    'Not employed, and not looking for work',
+    'Retired',
+    'I prefer not to say',
+]
+
+AI_BEN = [
+    'Increase productivity',
+    'Greater efficiency',
+    'Speed up learning',
+    'Improve accuracy in coding',
+    'Make workload more manageable',
+    'Improve collaboration',
+    'Other (please specify):',
+]
+
+AI_TOOL_CURRENTLY_USING = [
+    'Writing code',
+    'Debugging and getting help',
+    'Searching for answers',
+    'Learning about a codebase',
+    'Documenting code',
+    'Generating content or synthetic data',
+    'Testing code',
+    'Project planning',
+    'Committing and reviewing code',
+    'Predictive analytics',
+    'Deployment and monitoring',
+    'Other (please specify):',
+]
+
+# 單選題：欄位 -> 類別順序
+CATEGORIES = {
+    'Age': AGE,
+    'MainBranch': MAIN_BRANCH,
+    'EdLevel': ED_LEVEL,
+    'AISelect': AI_SELECT,
+    'AISent': AI_SENT,
+}
+
+# 多選題：欄位 -> 選項順序
+MULTI_SELECT = {
+    'Employment': EMPLOYMENT,
+    'AIBen': AI_BEN,
+    'AIToolCurrently Using': AI_TOOL_CURRENTLY_USING,
+}
+
+
+# 每一列的識別欄位，每個群組讀出來時都會帶上
+KEY_COLUMN = 'ResponseId'
+
+# 欄位群組：群組 -> 欄位（統一後的名稱，依問卷順序）。快照保存所有群組，
+# GetData 啟動時只讀 CORE_GROUPS，其他群組第一次被要求時才從快照讀出
+COLUMN_GROUPS = {
+    'demographics': ['MainBranch', 'Age', 'Employment', 'EdLevel'],
+    # Technology and tech culture 區塊
+    'technology': [
+        'LanguageHaveWorkedWith', 'LanguageWantToWorkWith', 'LanguageAdmired',
+        'DatabaseHaveWorkedWith', 'DatabaseWantToWorkWith', 'DatabaseAdmired',
+        'PlatformHaveWorkedWith', 'PlatformWantToWorkWith', 'PlatformAdmired',
+        'WebframeHaveWorkedWith', 'WebframeWantToWorkWith', 'WebframeAdmired',
+        'EmbeddedHaveWorkedWith', 'EmbeddedWantToWorkWith', 'EmbeddedAdmired',
+        'MiscTechHaveWorkedWith', 'MiscTechWantToWorkWith', 'MiscTechAdmired',
+        'ToolsTechHaveWorkedWith', 'ToolsTechWantToWorkWith', 'ToolsTechAdmired',
+        'NEWCollabToolsHaveWorkedWith', 'NEWCollabToolsWantToWorkWith', 'NEWCollabToolsAdmired',
+        'OpSysPersonal use', 'OpSysProfessional use',
+        'OfficeStackAsyncHaveWorkedWith', 'OfficeStackAsyncWantToWorkWith', 'OfficeStackAsyncAdmired',
+        'OfficeStackSyncHaveWorkedWith', 'OfficeStackSyncWantToWorkWith', 'OfficeStackSyncAdmired',
+        'AISearchDevHaveWorkedWith', 'AISearchDevWantToWorkWith', 'AISearchDevAdmired',
+    ],
+    # Stack Overflow usage + community 區塊
+    'so_usage': ['NEWSOSites', 'SOVisitFreq', 'SOAccount', 'SOPartFreq', 'SOHow', 'SOComm'],
+    'ai': ['AISelect', 'AISent', 'AIBen', 'AIToolCurrently Using'],
+}
+
+# 頁面都會用到、啟動時就載入的群組（cube 和 bitmap 索引也只涵蓋這些欄位）
+CORE_GROUPS = ('demographics', 'ai')
+
+
+def group_columns(*groups):
+    """The key column followed by the columns of ``groups``."""
+    columns = [KEY_COLUMN]
+    for group in groups:
+        if group not in COLUMN_GROUPS:
+            raise KeyError(f"Unknown column group: {group!r}")
+        columns += [column for column in COLUMN_GROUPS[group] if column not in columns]
+    return columns
+
+
+# 各年度問卷的欄位改名：年度 -> {原始欄位: 統一後的欄位}
+# 2023 年的 AI 搜尋工具（AISearch*）和 AI 開發工具（AIDev*）在 2024 年合併成 AISearchDev*；
+# 多個原始欄位對應到同一個欄位時，讀取時把各欄位的選項以分號合併
+COLUMN_ALIASES = {
+    2023: {
+        'AISearchHaveWorkedWith': 'AISearchDevHaveWorkedWith',
+        'AIDevHaveWorkedWith': 'AISearchDevHaveWorkedWith',
+        'AISearchWantToWorkWith': 'AISearchDevWantToWorkWith',
+        'AIDevWantToWorkWith': 'AISearchDevWantToWorkWith',
+    },
+    2024: {},
+}
+
+
+def ordered_categories(values, documented=()):
+    """Documented categories first, then any other observed values sorted."""
+    seen = set(pd.unique(pd.Series(values).dropna()))
+    extra = sorted(seen.difference(documented))
+    return list(documented) + extra
+
+
+def split_multi_select(categories, documented=()):
+    """Split the ';'-joined answer combinations of a multi-select column.
+
+    Returns the options and an indicator matrix where ``indicator[c, o]`` is
+    1 when combination ``c`` contains option ``o``.
+    """
+    parts = [[part.strip() for part in str(category).split(';')] for category in categories]
+    options = ordered_categories([p for ps in parts for p in ps], documented)
+    position = {option: i for i, option in enumerate(options)}
+    indicator = np.zeros((len(categories), len(options)), dtype=np.int64)
+    for c, ps in enumerate(parts):
+        for part in ps:
+            indicator[c, position[part]] = 1
+    return options, indicator
+
+
+def mask_dtype(n_options):
+    """Smallest unsigned integer type holding one bit per option."""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if n_options <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"Too many options for a bitmask: {n_options}")
+
+
+def mask_bits(masks, n_options):
+    """Expand bitmasks into a boolean (respondent x option) matrix."""
+    masks = np.asarray(masks)
+    shifts = np.arange(n_options, dtype=masks.dtype)
+    return ((masks[:, None] >> shifts) & 1).astype(bool)
+
+
+def encode_multi_select(df):
+    """Replace each multi-select column with a per-respondent bitmask.
+
+    Bit ``i`` of the mask is set when the respondent picked ``options[i]``;
+    a mask of 0 means the question was not answered. Returns the new frame
+    and the option lists as ``{column: [option, ...]}``.
+    """
+    df = df.copy()
+    options = {}
+    for column, documented in MULTI_SELECT.items():
+        if column not in df.columns:
+            continue
+        # 只拆分不同的答案組合，再用代碼對應回每一列
+        answers = df[column].astype('category')
+        column_options, indicator = split_multi_select(answers.cat.categories, documented)
+        dtype = mask_dtype(len(column_options))
+        weights = np.left_shift(np.uint64(1), np.arange(len(column_options), dtype=np.uint64))
+        combination_masks = np.append((indicator.astype(np.uint64) @ weights).astype(dtype), dtype(0))
+        # 代碼 -1（未作答）對應到最後一個元素 0
+        df[column] = combination_masks[answers.cat.codes.to_numpy()]
+        options[column] = column_options
+    return df, options
+
+
+def encode_categoricals(df):
+    """Return a copy of ``df`` with every string column dictionary-encoded."""
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype != object:
+            continue
+        categories = ordered_categories(df[column], CATEGORIES.get(column, ()))
+        df[column] = pd.Categorical(df[column], categories=categories)
+    return df
@@ -0,0 +1,231 @@
+"""Nearest-respondent index over the encoded answer profiles.
+
+A respondent's profile is one bit per category of ``Age``, ``MainBranch``
+and ``EdLevel`` plus one bit per option of the multi-select ``Employment``,
+``AIToolCurrently Using`` and ``AIBen`` answers, packed into a few uint64
+words. A query only compares the profile columns it is given (e.g. the
+four questions the funnel asks). For every set of compared columns the
+index keeps the distinct profiles restricted to those columns once, with
+the rows that share each one (built on the first query, then reused), so a
+query is XOR / AND + popcount over those few thousand profiles rather than
+a scan of every respondent, and the ``k`` nearest respondents are picked
+from a histogram of the integer distances instead of sorting them.
+
+``hamming`` counts the differing bits; ``jaccard`` is one minus the shared
+bits over the bits set in either profile, so answering fewer options is not
+rewarded.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import schema
+from utils.cache import cached_result
+
+PROFILE_COLUMNS = ('Age', 'Employment', 'MainBranch', 'EdLevel', 'AIToolCurrently Using', 'AIBen')
+METRICS = ('hamming', 'jaccard')
+
+
+def _popcount(words):
+    """Set bits per row of an (n, n_words) uint64 array."""
+    counts = np.bitwise_count(words)
+    # 六個欄位的 profile 通常放得進一個 word
+    return counts[:, 0] if counts.shape[1] == 1 else counts.sum(axis=1, dtype=np.int64)
+
+
+def _place(words, masks, first, width):
+    """OR ``width``-bit masks into ``words`` starting at bit ``first``."""
+    word, shift = divmod(first, 64)
+    words[:, word] |= masks << np.uint64(shift)
+    # 跨到下一個 word 的高位元
+    if shift and shift + width > 64:
+        words[:, word + 1] |= masks >> np.uint64(64 - shift)
+
+
+def _jaccard_ranks(n_bits):
+    """Table of ``rank[shared, union]`` ordering every possible Jaccard distance, and the distances."""
+    shared, union = np.meshgrid(np.arange(n_bits + 1), np.arange(n_bits + 1), indexing='ij')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = np.where(union > 0, 1 - shared / union, 0.0)
+    distances, ranks = np.unique(distance, return_inverse=True)
+    return ranks.reshape(distance.shape), distances
+
+
+def _gather(members, offsets, profiles):
+    """Rows of ``profiles`` (in that order) from the CSR member lists, without a Python loop."""
+    starts = offsets[profiles]
+    lengths = offsets[profiles + 1] - starts
+    first = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return members[first + np.arange(lengths.sum())]
+
+
+class _Profiles:
+    """Distinct profiles (restricted to some bits) with the rows that share each one."""
+
+    def __init__(self, words, mask):
+        masked = words & mask
+        if masked.shape[1] == 1:
+            # 一維的 unique 比 axis=0（逐列比較）快得多
+            profiles, inverse, counts = np.unique(masked[:, 0], return_inverse=True, return_counts=True)
+            profiles = profiles[:, None]
+        else:
+            profiles, inverse, counts = np.unique(masked, axis=0, return_inverse=True, return_counts=True)
+        # (不同 profile 數, n_words) 的 uint64
+        self.profiles = profiles
+        # profile p 的列是 members[offsets[p]:offsets[p + 1]]
+        self.members = np.argsort(inverse.ravel(), kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.counts = counts
+
+    @property
+    def nbytes(self):
+        return self.profiles.nbytes + self.members.nbytes + self.offsets.nbytes
+
+
+class SimilarityIndex:
+    """Bit-packed respondent profiles, grouped into distinct profiles per set of compared columns."""
+
+    def __init__(self, fields, words, data, options, version=None):
+        # 欄位 -> (第一個 bit 的位置, 類別 / 選項標籤)
+        self.fields = fields
+        # (n_rows, n_words) 的 uint64，每列一個 profile
+        self.words = words
+        # 結果要用到的欄位（ResponseId、AISent、AIToolCurrently Using）
+        self.data = data
+        self.options = options
+        # 有 version 時查詢結果放進共用的結果快取
+        self.version = version
+        self.n_bits = sum(len(labels) for _, labels in fields.values())
+        self._jaccard_rank, self._jaccard_distance = _jaccard_ranks(self.n_bits)
+        # 比較的 bits (mask) -> _Profiles
+        self._views = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, df, options, version=None, columns=PROFILE_COLUMNS):
+        fields = {}
+        n_bits = 0
+        for column in columns:
+            if column not in df.columns:
+                continue
+            labels = list(options[column]) if column in options else [str(c) for c in df[column].cat.categories]
+            fields[column] = (n_bits, labels)
+            n_bits += len(labels)
+
+        words = np.zeros((len(df), max(1, (n_bits + 63) // 64)), dtype=np.uint64)
+        for column, (first, labels) in fields.items():
+            if column in options:
+                masks = df[column].to_numpy().astype(np.uint64)
+            else:
+                # 單選題：答案的類別代碼對應到一個 bit，未作答沒有 bit
+                codes = df[column].cat.codes.to_numpy().astype(np.int64)
+                masks = np.where(codes >= 0, np.left_shift(np.uint64(1), np.maximum(codes, 0).astype(np.uint64)),
+                                 np.uint64(0))
+            _place(words, masks, first, len(labels))
+
+        data = df[[column for column in (schema.KEY_COLUMN, 'AISent', 'AIToolCurrently Using') if column in df.columns]]
+        return cls(fields, words, data, options, version)
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes + sum(view.nbytes for view in self._views.values())
+
+    def prepare(self, columns):
+        """Build the distinct profiles over ``columns`` ahead of the first query comparing them."""
+        _, mask = self.encode([(column, ()) for column in columns])
+        self._profiles(mask)
+        return self
+
+    def _profiles(self, mask):
+        key = mask.tobytes()
+        with self._lock:
+            view = self._views.get(key)
+            if view is None:
+                view = self._views[key] = _Profiles(self.words, mask)
+            return view
+
+    def encode(self, profile):
+        """Query words and the mask of the bits of the columns in ``profile``.
+
+        ``profile`` is a sequence of ``(column, values)`` pairs, ``values``
+        being one answer or several; an answer that is not a category /
+        option of the column raises ValueError.
+        """
+        query = np.zeros(self.words.shape[1], dtype=np.uint64)
+        mask = np.zeros_like(query)
+        for column, values in profile:
+            if column not in self.fields:
+                raise KeyError(f"Not a profile column: {column!r}")
+            first, labels = self.fields[column]
+            # 單一答案的字串不能直接用 in 比對（會變成子字串比對）
+            values = (values,) if isinstance(values, str) else tuple(values)
+            unknown = [value for value in values if value not in labels]
+            if unknown:
+                raise ValueError(f"Unknown answer(s) {unknown} for {column!r}")
+            for i, label in enumerate(labels):
+                word, shift = divmod(first + i, 64)
+                bit = np.left_shift(np.uint64(1), np.uint64(shift))
+                mask[word] |= bit
+                if label in values:
+                    query[word] |= bit
+        return query, mask
+
+    def nearest(self, profile, k=100, metric='jaccard'):
+        """Row positions of the ``k`` respondents closest to ``profile`` and their distances.
+
+        Ties are broken by row order, so the answer is deterministic.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}, got {metric!r}")
+        query, mask = self.encode(profile)
+        view = self._profiles(mask)
+        if metric == 'hamming':
+            keys = _popcount(view.profiles ^ query)
+            distance_of = np.arange(self.n_bits + 1)
+        else:
+            shared = _popcount(view.profiles & query)
+            union = _popcount(view.profiles | query)
+            keys = self._jaccard_rank[shared, union]
+            distance_of = self._jaccard_distance
+
+        # 依距離累加人數，找出第 k 個人所在的距離，不需要排序所有 profile
+        k = min(k, len(self.words))
+        cumulative = np.cumsum(np.bincount(keys, weights=view.counts, minlength=len(distance_of)))
+        threshold = int(np.searchsorted(cumulative, k))
+        closer = np.flatnonzero(keys < threshold)
+        rows = _gather(view.members, view.offsets, closer)
+        # 在第 k 個人的距離上同距離的人，依列的順序取到 k 人為止
+        tied = np.sort(_gather(view.members, view.offsets, np.flatnonzero(keys == threshold)))[:k - len(rows)]
+        rows = np.concatenate([rows, tied])
+        row_keys = np.concatenate([np.repeat(keys[closer], view.counts[closer]), np.full(len(tied), threshold)])
+        order = np.lexsort((rows, row_keys))
+        return rows[order], distance_of[row_keys[order]]
+
+    @cached_result
+    def similar(self, profile, k=100, metric='jaccard'):
+        """The ``k`` respondents most like ``profile`` with their AI sentiment and tool distributions.
+
+        Returns a dict of DataFrames: ``respondents`` (ResponseId, distance,
+        AISent, nearest first), ``sentiment`` and ``tools`` (count and
+        percentage of the neighbours who answered).
+        """
+        rows, distances = self.nearest(profile, k, metric)
+        neighbours = self.data.iloc[rows]
+        respondents = pd.DataFrame({
+            schema.KEY_COLUMN: neighbours[schema.KEY_COLUMN].to_numpy(),
+            'distance': distances,
+            'AISent': neighbours['AISent'].to_numpy(),
+        })
+
+        sentiment = neighbours['AISent'].value_counts(sort=False)
+        sentiment = sentiment[sentiment > 0].rename_axis('AISent').reset_index(name='count')
+        sentiment['percentage'] = sentiment['count'] / sentiment['count'].sum() * 100
+
+        options = self.options['AIToolCurrently Using']
+        bits = schema.mask_bits(neighbours['AIToolCurrently Using'].to_numpy(), len(options))
+        answered = bits.any(axis=1).sum()
+        tools = pd.DataFrame({'AIToolCurrently Using': options, 'count': bits.sum(axis=0)})
+        tools = tools[tools['count'] > 0].sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+        tools['percentage'] = tools['count'] / answered * 100 if answered else 0.0
+        return {'respondents': respondents, 'sentiment': sentiment, 'tools': tools}
@@ -0,0 +1,266 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from utils import telemetry
+from utils.schema import COLUMN_GROUPS, encode_categoricals, encode_multi_select, group_columns
+
+logger = logging.getLogger(__name__)
+
+SOURCE_ZIP = 'survey_results_public.csv.zip'
+SNAPSHOT_FILE = 'survey_results_public.arrow'
+
+# 快照保存所有欄位群組（見 utils/schema.py 的 COLUMN_GROUPS）
+COLUMNS = group_columns(*COLUMN_GROUPS)
+
+# 解析 CSV 的方式：pyarrow（多執行緒，預設）或 pandas（單執行緒）
+READ_ENGINE = os.environ.get('SURVEY_READ_ENGINE', 'pyarrow')
+# pyarrow 每個 block 由一個 thread 解析，block 數要比核心數多才分得開
+READ_BLOCK_SIZE = int(os.environ.get('SURVEY_READ_BLOCK_KB', '4096')) * 1024
+# pandas.read_csv 預設當作缺值的字串，pyarrow 也照這份清單讀，兩種方式結果相同
+NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+# 寫入 Arrow schema metadata 的 key，用來記錄快照對應的原始 zip
+SOURCE_HASH_KEY = b'source_sha256'
+# 快照格式有變動時遞增，舊格式的快照會自動重建
+FORMAT_KEY = b'snapshot_format'
+FORMAT_VERSION = b'4'
+# 讀取時套用的欄位改名（JSON），改名規則變動時快照也要重建
+ALIASES_KEY = b'column_aliases'
+# 多選題的選項清單（JSON），bitmask 的第 i 個 bit 對應第 i 個選項
+OPTIONS_KEY = b'multi_select_options'
+
+
+def source_hash(zip_path=SOURCE_ZIP):
+    """Return the sha256 hex digest of the source zip."""
+    digest = hashlib.sha256()
+    with open(zip_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_source(zip_path=SOURCE_ZIP, aliases=None, columns=COLUMNS, engine=None):
+    """Read ``columns`` of a survey zip, renaming them via ``aliases``.
+
+    ``columns`` are the renamed names; ``None`` reads every column. The
+    ``pyarrow`` engine parses the decompressed stream in blocks on all
+    cores; ``pandas`` is the single-threaded ``pd.read_csv``. Both give
+    the same values and the same snapshot (missing strings are ``None``
+    rather than NaN with ``pyarrow``).
+    """
+    aliases = aliases or {}
+    engine = engine or READ_ENGINE
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        # 假设 ZIP 文件中只有一个 CSV 文件
+        csv_filename = zip_ref.namelist()[0]
+        with zip_ref.open(csv_filename) as f:
+            if engine == 'pandas':
+                usecols = None if columns is None else (lambda x: aliases.get(x, x) in columns)
+                data = pd.read_csv(f, usecols=usecols)
+            elif engine == 'pyarrow':
+                data = _read_csv_arrow(f, _source_columns(zip_ref, csv_filename, aliases, columns))
+            else:
+                raise ValueError(f"Unknown read engine: {engine!r}")
+    return _merge_columns(data.rename(columns=aliases))
+
+
+def _merge_columns(data):
+    """Join columns renamed to the same name into one ``;``-separated column."""
+    duplicated = data.columns[data.columns.duplicated()].unique()
+    if duplicated.empty:
+        return data
+    merged = {}
+    for column in duplicated:
+        parts = data.loc[:, data.columns == column]
+        joined = parts.iloc[:, 0].astype(object)
+        for i in range(1, parts.shape[1]):
+            part = parts.iloc[:, i].astype(object)
+            joined = joined.where(part.isna(), part.where(joined.isna(), joined + ';' + part))
+        merged[column] = joined
+    data = data.loc[:, ~data.columns.duplicated()].copy()
+    for column, values in merged.items():
+        data[column] = values
+    return data
+
+
+def _source_columns(zip_ref, csv_filename, aliases, columns):
+    """Original names of the header columns that map to ``columns``, in file order."""
+    with zip_ref.open(csv_filename) as f:
+        header = next(csv.reader(io.TextIOWrapper(f, encoding='utf-8-sig', newline='')))
+    return [name for name in header if columns is None or aliases.get(name, name) in columns]
+
+
+def _read_csv_arrow(f, include_columns):
+    # 解壓縮是單一串流，pyarrow 邊讀邊把每個 block 交給 thread pool 解析
+    table = pa_csv.read_csv(
+        f,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=READ_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=include_columns,
+            null_values=NA_VALUES,
+            strings_can_be_null=True,
+        ),
+    )
+    # 全部是缺值的欄位 pyarrow 推斷為 null 型別，pandas 則是 float64
+    for i, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(i, field.name, pa.nulls(len(table), pa.float64()))
+    return table.to_pandas()
+
+
+def _aliases_stamp(aliases):
+    return json.dumps(aliases or {}, sort_keys=True).encode()
+
+
+def build_snapshot(zip_path=SOURCE_ZIP, snapshot_path=SNAPSHOT_FILE, digest=None, aliases=None):
+    """Parse the survey zip once and write it as an uncompressed Arrow IPC file."""
+    digest = digest or source_hash(zip_path)
+    # 多選題轉成 bitmask，其餘字串欄位以 dictionary 編碼寫入，讀回時直接是 pandas categorical
+    data, options = encode_multi_select(read_source(zip_path, aliases))
+    data = encode_categoricals(data)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        **snapshot_stamp(digest, options, aliases),
+    })
+    return write_snapshot(snapshot_path, table.schema, [table])
+
+
+def snapshot_stamp(digest, options, aliases=None):
+    """Schema metadata marking a snapshot as current for ``digest``."""
+    return {
+        SOURCE_HASH_KEY: digest.encode(),
+        FORMAT_KEY: FORMAT_VERSION,
+        OPTIONS_KEY: json.dumps(options).encode(),
+        ALIASES_KEY: _aliases_stamp(aliases),
+    }
+
+
+def write_snapshot(snapshot_path, schema, tables):
+    """Write tables or record batches to ``snapshot_path`` as one Arrow IPC file.
+
+    The file is written next to ``snapshot_path`` and atomically renamed into
+    place, so concurrent readers never see a half-written snapshot.
+    """
+    directory = os.path.dirname(os.path.abspath(snapshot_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.arrow.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for table in tables:
+                    writer.write(table)
+        os.replace(tmp_path, snapshot_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return snapshot_path
+
+
+def snapshot_metadata(snapshot_path=SNAPSHOT_FILE):
+    """Return the schema metadata of a snapshot, or {} if unreadable."""
+    try:
+        with pa.memory_map(snapshot_path, 'r') as source:
+            return pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return {}
+
+
+def snapshot_columns(snapshot_path=SNAPSHOT_FILE):
+    """Column names stored in a snapshot."""
+    with pa.memory_map(snapshot_path, 'r') as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def snapshot_hash(snapshot_path=SNAPSHOT_FILE):
+    """Return the source hash recorded in a current-format snapshot, or None."""
+    metadata = snapshot_metadata(snapshot_path)
+    if metadata.get(FORMAT_KEY) != FORMAT_VERSION:
+        return None
+    value = metadata.get(SOURCE_HASH_KEY)
+    return value.decode() if value else None
+
+
+def snapshot_options(snapshot_path=SNAPSHOT_FILE):
+    """Return the multi-select option lists recorded in a snapshot."""
+    value = snapshot_metadata(snapshot_path).get(OPTIONS_KEY)
+    return json.loads(value) if value else {}
+
+
+def cube_path(snapshot_path=SNAPSHOT_FILE):
+    """Path of the count cube persisted next to a snapshot."""
+    return os.path.splitext(snapshot_path)[0] + '.cube.npz'
+
+
+def ensure_snapshot(zip_path=SOURCE_ZIP, snapshot_path=SNAPSHOT_FILE, aliases=None):
+    """Rebuild the snapshot if it is missing or was built from another zip."""
+    if not os.path.exists(zip_path):
+        # 部署時可以只帶快照，不帶原始 zip
+        if os.path.exists(snapshot_path):
+            return snapshot_path
+        raise FileNotFoundError(zip_path)
+
+    digest = source_hash(zip_path)
+    stale_aliases = snapshot_metadata(snapshot_path).get(ALIASES_KEY) != _aliases_stamp(aliases)
+    if snapshot_hash(snapshot_path) != digest or stale_aliases:
+        logger.info("Building snapshot %s from %s", snapshot_path, zip_path)
+        with telemetry.span('snapshot.build', snapshot=os.path.basename(snapshot_path)):
+            build_snapshot(zip_path, snapshot_path, digest=digest, aliases=aliases)
+    return snapshot_path
+
+
+def load_snapshot(snapshot_path=SNAPSHOT_FILE, columns=None):
+    """Memory-map the snapshot and return ``columns`` of it as a DataFrame.
+
+    Only the requested columns are converted to pandas; the others are
+    never read from the mapped file. Columns the snapshot does not have
+    (e.g. questions missing from an older survey) are skipped.
+    """
+    source = pa.memory_map(snapshot_path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select([column for column in columns if column in table.schema.names])
+    return table.to_pandas()
+
+
+def iter_snapshot(snapshot_path=SNAPSHOT_FILE, columns=None, batch_size=65536):
+    """Yield ``columns`` of the snapshot as DataFrames of at most ``batch_size`` rows.
+
+    Every frame has the categories of the whole snapshot, and only one
+    batch is converted to pandas at a time.
+    """
+    source = pa.memory_map(snapshot_path, 'r')
+    reader = pa.ipc.open_file(source)
+    if columns is not None:
+        columns = [column for column in columns if column in reader.schema.names]
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if columns is not None:
+            batch = batch.select(columns)
+        # 快照可能只有一個很大的 record batch，再切成 batch_size 列
+        for offset in range(0, batch.num_rows, batch_size):
+            yield batch.slice(offset, batch_size).to_pandas()
+
+
+if __name__ == "__main__":
+    # python -m utils.snapshot [year ...] 預先建立快照，不指定年度時建立所有年度
+    import sys
+    from utils.partitions import available_years, snapshot_file, source_zip
+    from utils.schema import COLUMN_ALIASES
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for year in [int(arg) for arg in sys.argv[1:]] or available_years():
+        print(ensure_snapshot(source_zip(year), snapshot_file(year), COLUMN_ALIASES.get(year)))
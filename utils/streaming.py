@@ -0,0 +1,120 @@
+"""Streaming execution for datasets too large to hold as one DataFrame.
+
+``StreamingSurvey`` never loads the whole survey: it reads the snapshot in
+record batches of ``batch_size`` rows (only the columns a computation needs)
+and folds every batch into count arrays, so memory is bounded by the batch
+size whatever the number of respondents. It offers the aggregated results
+of ``Client``:
+
+- the ``get_*`` crosstabs, value counts and per-option benefit counts,
+  computed by ``Calculate`` from a count cube folded batch by batch,
+- ``count(by, where, multi)``, any filter-and-count query (e.g. tool usage
+  per sentiment), with the per-batch counts added up.
+
+Results are identical to the in-memory ``Client``. The snapshot's columns
+are checked when the stream is opened: a getter whose cube dimensions the
+snapshot lacks (e.g. an older survey without a question) raises a KeyError
+naming the missing columns instead of failing inside the computation.
+Row-level outputs
+(``get_favorable_on_edu_and_code``, ``get_AI_tool_currently_using``) grow
+with the dataset and are not offered; use ``count`` instead.
+
+    survey = StreamingSurvey(2030, batch_size=100_000)
+    survey.get_edu_brain_for_heatmap()
+    survey.count(by=['AIToolCurrently Using'], where={'AISent': 'Favorable'})
+"""
+import os
+
+from utils import telemetry
+from utils.calculate import Calculate
+from utils.cube import CUBES, CountCube
+from utils.partitions import DEFAULT_YEAR, snapshot_file, source_zip
+from utils.query import QueryEngine, tidy
+from utils.schema import COLUMN_ALIASES, KEY_COLUMN
+from utils.snapshot import ensure_snapshot, iter_snapshot, snapshot_columns, snapshot_hash, snapshot_options
+
+# 每個 batch 的列數，可用環境變數 SURVEY_STREAM_BATCH_ROWS 調整
+DEFAULT_BATCH_SIZE = int(os.environ.get('SURVEY_STREAM_BATCH_ROWS', '65536'))
+
+# get_* -> Calculate 從 cube 取出的維度
+GETTER_COLUMNS = {
+    'get_AI_usage': ('AISelect',),
+    'get_age_usage': ('Age',),
+    'get_age_employment_distribution': ('Age', 'Employment'),
+    'get_ai_usage_percentage': ('Employment', 'Age', 'AISelect'),
+    'get_edu_brain_for_heatmap': ('EdLevel', 'MainBranch'),
+    'get_benefit_wordcloud': ('AISent', 'AIBen'),
+}
+
+
+class StreamingSurvey:
+    def __init__(self, year=DEFAULT_YEAR, batch_size=DEFAULT_BATCH_SIZE):
+        self.year = year
+        self.batch_size = batch_size
+        self.snapshot_path = ensure_snapshot(source_zip(year), snapshot_file(year), COLUMN_ALIASES.get(year))
+        self.version = snapshot_hash(self.snapshot_path)
+        self.options = snapshot_options(self.snapshot_path)
+        columns = set(snapshot_columns(self.snapshot_path))
+        # get_* -> 快照缺少的欄位；這些 getter 無法從 cube 計算
+        self.missing = {
+            getter: [column for column in dims if column not in columns]
+            for getter, dims in GETTER_COLUMNS.items()
+            if not columns.issuperset(dims)
+        }
+        self._calculate = None
+
+    def _require(self, getter):
+        if getter in self.missing:
+            raise KeyError(f"{getter} needs column(s) {self.missing[getter]} missing from {self.snapshot_path}")
+
+    def batches(self, columns=None):
+        """The snapshot's ``columns`` as DataFrames of at most ``batch_size`` rows."""
+        return iter_snapshot(self.snapshot_path, columns, self.batch_size)
+
+    @property
+    def calculate(self):
+        """``Calculate`` over the count cube folded from all batches (built on first use)."""
+        if self._calculate is None:
+            with telemetry.span('StreamingSurvey.cube', year=self.year):
+                columns = sorted({dim for dims in CUBES.values() for dim in dims})
+                cube = CountCube.build_batches(self.batches(columns), self.options, self.version)
+            # getter 傳入 None 代表 cube 所計數的整份資料集，Calculate 只從 cube 計算
+            self._calculate = Calculate(options=self.options, cube=cube)
+        return self._calculate
+
+    def get_AI_usage(self):
+        self._require('get_AI_usage')
+        return self.calculate.calculate_percentage_of_AI_usage(None)
+
+    def get_age_usage(self):
+        self._require('get_age_usage')
+        return self.calculate.calculate_percentage_of_age(None)
+
+    def get_age_employment_distribution(self):
+        self._require('get_age_employment_distribution')
+        return self.calculate.calculate_age_employment_distribution(None)
+
+    def get_ai_usage_percentage(self):
+        self._require('get_ai_usage_percentage')
+        return self.calculate.calculate_ai_usage_percentage(None, None)
+
+    def get_edu_brain_for_heatmap(self):
+        self._require('get_edu_brain_for_heatmap')
+        return self.calculate.calculate_edu_brain_for_heatmap(None, None)
+
+    def get_benefit_wordcloud(self):
+        self._require('get_benefit_wordcloud')
+        return self.calculate.benefit_wordcloud(None)
+
+    def count(self, by=(), where=None, multi='any'):
+        """``Client.count`` computed one batch at a time."""
+        with telemetry.span('StreamingSurvey.count', year=self.year):
+            # 同一欄位可能同時在 by 和 where 裡，只讀一次
+            columns = list(dict.fromkeys([KEY_COLUMN, *by, *(where or {})]))
+            total = labels = None
+            for batch in self.batches(columns):
+                counts, labels = QueryEngine(batch, self.options).count_array(by, where, multi)
+                total = counts if total is None else total + counts
+            if total is None:
+                raise ValueError(f"Snapshot {self.snapshot_path} has no rows")
+            return tidy(total, list(by), labels)
@@ -0,0 +1,324 @@
+"""Structured instrumentation for the data layer.
+
+Timing spans around ``GetData``, ``Client`` and ``Calculate`` calls, result
+cache hit/miss counters, rows scanned and bytes allocated per call. It is
+off by default and configured with environment variables:
+
+``SURVEY_TELEMETRY``
+    ``0`` (default) disables everything, ``1`` traces every call, a value
+    between 0 and 1 traces that fraction of top-level calls (nested spans
+    follow their parent). Counters are kept whenever telemetry is on.
+``SURVEY_TELEMETRY_FILE``
+    Append every finished span to this file as one JSON line.
+``SURVEY_TELEMETRY_PROM_FILE``
+    Keep the metrics in Prometheus text format in this file, rewritten at
+    most every ``SURVEY_TELEMETRY_PROM_INTERVAL`` seconds (default 15), e.g.
+    for the node_exporter textfile collector.
+
+The same can be set at runtime with ``configure()``; ``prometheus_text()``
+and ``metrics()`` return the current values.
+"""
+import atexit
+import functools
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+# Prometheus histogram 的區間（秒）
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_local = threading.local()
+_trace_ids = itertools.count(1)
+
+_rate = 0.0
+_jsonl_path = None
+_prom_path = None
+_prom_interval = 15.0
+_prom_written = 0.0
+
+# (名稱, labels) -> 值
+_counters = {}
+# (名稱, labels) -> [各區間次數..., 總和, 次數]
+_histograms = {}
+
+
+def configure(rate=None, jsonl_path=None, prom_path=None, prom_interval=None):
+    """Change the sampling rate and exporters; arguments left as None are kept."""
+    global _rate, _jsonl_path, _prom_path, _prom_interval
+    if rate is not None:
+        if not 0 <= float(rate) <= 1:
+            raise ValueError(f"Sampling rate must be between 0 and 1, got {rate!r}")
+        _rate = float(rate)
+    if jsonl_path is not None:
+        _jsonl_path = jsonl_path or None
+    if prom_path is not None:
+        _prom_path = prom_path or None
+    if prom_interval is not None:
+        _prom_interval = float(prom_interval)
+
+
+def enabled():
+    return _rate > 0
+
+
+def reset():
+    """Drop all collected counters and histograms."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name, value=1, **labels):
+    """Increment a counter (no-op while telemetry is off)."""
+    if _rate <= 0:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Add a duration to a histogram (no-op while telemetry is off)."""
+    if _rate <= 0:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(DURATION_BUCKETS) + 2)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Span:
+    """One timed call; use through ``span()``."""
+
+    __slots__ = ('name', 'labels', 'attrs', 'sampled', 'trace', 'parent', 'start', 'wall')
+
+    def __init__(self, name, labels, sampled, trace=None, parent=None):
+        self.name = name
+        self.labels = labels
+        self.attrs = {}
+        self.sampled = sampled
+        self.trace = trace
+        self.parent = parent
+
+    def set(self, **attrs):
+        if self.sampled:
+            self.attrs.update(attrs)
+        return self
+
+    def add(self, **amounts):
+        """Accumulate numeric attributes such as ``rows_scanned``."""
+        if self.sampled:
+            for key, value in amounts.items():
+                self.attrs[key] = self.attrs.get(key, 0) + value
+        return self
+
+    def __enter__(self):
+        _stack().append(self)
+        if self.sampled:
+            self.wall = time.time()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _stack().pop()
+        if not self.sampled:
+            return False
+        duration = time.perf_counter() - self.start
+        observe('survey_span_duration_seconds', duration, span=self.name)
+        for attr in ('rows_scanned', 'bytes_allocated'):
+            if attr in self.attrs:
+                count(f'survey_{attr}_total', self.attrs[attr], span=self.name)
+        if exc_type is not None:
+            count('survey_span_errors_total', span=self.name, error=exc_type.__name__)
+        if _jsonl_path:
+            _write_jsonl({
+                'ts': self.wall,
+                'span': self.name,
+                'duration_ms': duration * 1000,
+                'trace': self.trace,
+                'parent': self.parent,
+                'thread': threading.current_thread().name,
+                **({'labels': self.labels} if self.labels else {}),
+                **({'attrs': self.attrs} if self.attrs else {}),
+                **({'error': f'{exc_type.__name__}: {exc}'} if exc_type is not None else {}),
+            })
+        if _prom_path:
+            _maybe_write_prometheus()
+        return False
+
+
+class _Disabled:
+    """Shared span used while telemetry is off."""
+
+    sampled = False
+
+    def set(self, **attrs):
+        return self
+
+    add = set
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_DISABLED = _Disabled()
+
+
+def span(name, **labels):
+    """Context manager timing a block as span ``name``.
+
+    Top-level spans are sampled at the configured rate; nested spans are
+    recorded only when their parent is.
+    """
+    if _rate <= 0:
+        return _DISABLED
+    stack = _stack()
+    if stack:
+        parent = stack[-1]
+        return Span(name, labels, parent.sampled, parent.trace, parent.name)
+    sampled = _rate >= 1 or random.random() < _rate
+    return Span(name, labels, sampled, next(_trace_ids) if sampled else None)
+
+
+def current():
+    """The innermost open span of this thread (a no-op span if none is recording)."""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else _DISABLED
+
+
+def recording():
+    """Whether the current thread is inside a sampled span."""
+    return current().sampled
+
+
+def traced(name=None):
+    """Decorator wrapping every call of a function in a span."""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _rate <= 0:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _write_jsonl(record):
+    line = json.dumps(record, default=str) + '\n'
+    with _lock:
+        with open(_jsonl_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def metrics():
+    """Snapshot of the counters and histograms as plain dicts."""
+    with _lock:
+        return {
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(_counters.items())
+            ],
+            'histograms': [
+                {'name': name, 'labels': dict(labels), 'buckets': dict(zip(DURATION_BUCKETS, values[:-2])),
+                 'sum': values[-2], 'count': values[-1]}
+                for (name, labels), values in sorted(_histograms.items())
+            ],
+        }
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def prometheus_text():
+    """The metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f'# TYPE {name} counter')
+            typed.add(name)
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+    for (name, labels), values in histograms:
+        if name not in typed:
+            lines.append(f'# TYPE {name} histogram')
+            typed.add(name)
+        for bound, bucket in zip(DURATION_BUCKETS, values[:-2]):
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", str(bound))])} {bucket}')
+        lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {values[-1]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {values[-2]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    """Atomically write ``prometheus_text()`` to ``path``."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.prom.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _maybe_write_prometheus():
+    global _prom_written
+    now = time.monotonic()
+    if now - _prom_written < _prom_interval:
+        return
+    _prom_written = now
+    write_prometheus(_prom_path)
+
+
+@atexit.register
+def _flush():
+    # 結束時寫出最後一次的指標
+    if _prom_path and enabled():
+        write_prometheus(_prom_path)
+
+
+configure(
+    rate=os.environ.get('SURVEY_TELEMETRY', '0'),
+    jsonl_path=os.environ.get('SURVEY_TELEMETRY_FILE', ''),
+    prom_path=os.environ.get('SURVEY_TELEMETRY_PROM_FILE', ''),
+    prom_interval=os.environ.get('SURVEY_TELEMETRY_PROM_INTERVAL', '15'),
+)
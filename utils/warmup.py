@@ -0,0 +1,75 @@
+"""Background warm-up of the heavy libraries and the dataset.
+
+The welcome page (``app.py``) only needs Streamlit, so it is drawn before
+anything else is loaded. Right after that it calls ``start()``, which in a
+daemon thread imports pandas and Plotly (including the trace types the
+charts use) and loads the survey data (``get_client()``) while the user
+reads the page; the first data page then finds them ready instead of
+paying for them, and it schedules the first page's data on the prefetch
+pool (``Client.prefetch_next``). Only one warm-up runs per process;
+``SURVEY_WARMUP=0`` turns it off.
+"""
+import importlib
+import os
+import threading
+import time
+
+# 資料頁面一定會用到的模組，依載入順序排列
+MODULES = ('numpy', 'pandas', 'pyarrow', 'plotly.graph_objects', 'plotly.express', 'plotly.io')
+
+_lock = threading.Lock()
+_thread = None
+_done = threading.Event()
+# 各步驟花費的秒數
+timings = {}
+error = None
+
+
+def _run():
+    global error
+    try:
+        for name in MODULES:
+            start = time.perf_counter()
+            importlib.import_module(name)
+            timings[name] = time.perf_counter() - start
+        # plotly 在第一次用到時才載入各種 trace 的類別、驗證器和 JSON 編碼（連帶 IPython），
+        # 先把頁面用到的圖表種類序列化一次
+        start = time.perf_counter()
+        go = importlib.import_module('plotly.graph_objects')
+        pio = importlib.import_module('plotly.io')
+        pio.to_json(go.Figure([go.Pie(), go.Bar(), go.Heatmap()]), validate=False)
+        timings['plotly_traces'] = time.perf_counter() - start
+        # 延後到這裡才載入，welcome page 不需要 pandas / pyarrow
+        from utils.client import get_client
+
+        start = time.perf_counter()
+        client = get_client()
+        timings['get_client'] = time.perf_counter() - start
+        # 第一頁的資料也交給預先計算
+        client.prefetch_next('app')
+    except Exception as e:
+        # 頁面之後自己呼叫 get_client() 時會看到同樣的錯誤
+        error = e
+    finally:
+        _done.set()
+
+
+def start():
+    """Start the warm-up thread unless it already ran in this process."""
+    global _thread
+    if os.environ.get('SURVEY_WARMUP', '1') == '0':
+        return None
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name='survey-warmup', daemon=True)
+            _thread.start()
+    return _thread
+
+
+def wait(timeout=None):
+    """Block until the warm-up finished; False if ``timeout`` expired first."""
+    return _done.wait(timeout)
+
+
+def done():
+    return _done.is_set()